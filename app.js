@@ -1,8 +1,58 @@
 (function($) {
 
 	"use strict";
+	var shards = {
+		index: null,
+		cache: {},
+		pending: {},
+		onload: null,
+		load: function(url) {
+			return $.ajax({url: url, dataType: 'json', type: 'GET'});
+		},
+		fetch: function(file) {
+			// bootstrap-calendar wants the events right away, so missing
+			// shards are loaded in the background and the view is redrawn
+			var self = this;
+			if(this.pending[file]) {
+				return;
+			}
+			this.pending[file] = true;
+			this.load(file).done(function(json) {
+				self.cache[file] = json.result;
+			}).fail(function() {
+				self.cache[file] = [];
+			}).always(function() {
+				delete self.pending[file];
+				if(self.onload) {
+					self.onload();
+				}
+			});
+		},
+		events: function(start, end) {
+			var from = start.getTime(), to = end.getTime(), seen = {}, events = [];
+			for(var i = 0; i < this.index.shards.length; i++) {
+				var shard = this.index.shards[i];
+				if(shard.end <= from || shard.start >= to) {
+					continue;
+				}
+				var result = this.cache[shard.file];
+				if(!result) {
+					this.fetch(shard.file);
+					continue;
+				}
+				for(var j = 0; j < result.length; j++) {
+					var event = result[j], key = event.id + ':' + event.start;
+					if(event.end >= from && event.start < to && !seen[key]) {
+						seen[key] = true;
+						events.push(event);
+					}
+				}
+			}
+			return events;
+		}
+	};
 	var options = {
-		events_source: 'events.json',
+		events_source: function(start, end) { return shards.events(start, end); },
 		view: 'month',
 		modal: '#events-modal',
 		tmpl_path: 'tmpls/',
@@ -21,19 +71,26 @@
 		modal_title: function(event) { return event.title }
 	};
 
-	var calendar = $('#calendar').calendar(options);
+	shards.load('events-index.json').done(function(index) {
+		shards.index = index;
+	}).fail(function() {
+		shards.index = {shards: [{file: 'events.json', start: 0, end: Infinity}]};
+	}).always(function() {
+		var calendar = $('#calendar').calendar(options);
+		shards.onload = function() { calendar.view(); };
 
-	$('.btn-group button[data-calendar-nav]').each(function() {
-		var $this = $(this);
-		$this.click(function() {
-			calendar.navigate($this.data('calendar-nav'));
+		$('.btn-group button[data-calendar-nav]').each(function() {
+			var $this = $(this);
+			$this.click(function() {
+				calendar.navigate($this.data('calendar-nav'));
+			});
 		});
-	});
 
-	$('.btn-group button[data-calendar-view]').each(function() {
-		var $this = $(this);
-		$this.click(function() {
-			calendar.view($this.data('calendar-view'));
+		$('.btn-group button[data-calendar-view]').each(function() {
+			var $this = $(this);
+			$this.click(function() {
+				calendar.view($this.data('calendar-view'));
+			});
 		});
 	});
 
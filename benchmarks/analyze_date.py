@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# -.- encoding: utf-8 -.-
+# compares the combined date matcher with the old regex cascade
+# run with `python -m benchmarks.analyze_date`
+import calendargenerator as cg
+from . import synthetic
+
+ROWS = 50000
+
+
+def classify_cascade(cells):
+	for date in cells:
+		for regex, dateClass in cg.tests:
+			rg = regex.match(date)
+			if rg:
+				break
+
+
+def classify_combined(cells):
+	for date in cells:
+		cg.match_date(date)
+
+
+if __name__ == "__main__":
+	cells = [date for _, date, _ in synthetic.make_rows(ROWS)]
+	synthetic.report("cascade (%d cells)" % ROWS, synthetic.timeit(classify_cascade, cells), ROWS)
+	synthetic.report("combined (%d cells)" % ROWS, synthetic.timeit(classify_combined, cells), ROWS)
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -.- encoding: utf-8 -.-
+# move_to_archive on a large synthetic Termine/Archiv pair
+# run with `python -m benchmarks.archive`
+import datetime
+import calendargenerator as cg
+from . import synthetic
+
+ROWS = 20000
+ARCHIVE_ROWS = 50000
+
+
+def count_parses(func, *args):
+	calls = []
+	tokenize = cg.iter_wiki_page
+
+	def counting_tokenize(content):
+		calls.append(len(content))
+		return tokenize(content)
+	cg.iter_wiki_page = counting_tokenize
+	try:
+		func(*args)
+	finally:
+		cg.iter_wiki_page = tokenize
+	return len(calls)
+
+
+if __name__ == "__main__":
+	termine = synthetic.make_page(ROWS, seed=1, years=(2017, 2020))
+	archive = synthetic.make_page(ARCHIVE_ROWS, seed=2, years=(2010, 2017), title="= Termine Archiv =")
+	threshold = cg.tz.localize(datetime.datetime(2018, 6, 1))
+	print("tokenize calls: %d" % count_parses(cg.move_to_archive, termine, archive, threshold))
+	seconds = synthetic.timeit(cg.move_to_archive, termine, archive, threshold, repeat=1)
+	synthetic.report("move_to_archive (%d + %d rows)" % (ROWS, ARCHIVE_ROWS), seconds, ROWS + ARCHIVE_ROWS)
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+# -.- encoding: utf-8 -.-
+# generate_ical with the icalendar object tree vs. the streaming writer
+# run with `python -m benchmarks.ical`
+import os
+import shutil
+import tempfile
+import calendargenerator as cg
+from . import synthetic
+
+ROWS = 20000
+
+
+if __name__ == "__main__":
+	entries = cg.parse_wiki_page(synthetic.make_page(ROWS))
+	directory = tempfile.mkdtemp()
+	try:
+		for streaming in (False, True):
+			filename = os.path.join(directory, "events-%d.ics" % streaming)
+			seconds = synthetic.timeit(cg.generate_ical, entries, filename, None, streaming)
+			label = "streaming writer" if streaming else "icalendar"
+			synthetic.report("%s (%d events)" % (label, len(entries)), seconds, len(entries))
+		same = open(os.path.join(directory, "events-0.ics")).read() == open(os.path.join(directory, "events-1.ics")).read()
+		print("identical output: %s" % same)
+	finally:
+		shutil.rmtree(directory)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -.- encoding: utf-8 -.-
+# json export of a large feed with the epoch times from time.mktime (as
+# before) vs. the cached utc timestamps of the sort keys, from a list of
+# entries and from an OccurrenceStore
+# run with `python -m benchmarks.json_export`
+import hashlib
+import io
+import time
+import calendargenerator as cg
+from . import synthetic
+
+ROWS = 8000
+
+
+def json_mktime(entry):
+	result = {}
+	result["id"] = hashlib.md5(entry.getPlainName().encode("utf8")).hexdigest()
+	result["title"] = entry.getDetailPlain()
+	result["url"] = entry.getURL()
+	result["class"] = "event-%s" % cg.simple_name(entry.category)
+	result["start"] = int(time.mktime(entry.start_date.timetuple()) * 1000)
+	result["end"] = int(time.mktime(entry.end_date.timetuple()) * 1000) - 1
+	return result
+
+
+def export_mktime(entries):
+	cg.write_json_items((json_mktime(entry) for entry in entries), io.StringIO())
+
+
+def export(entries):
+	for entry in entries:
+		entry._sort_key = None
+	cg.write_json(entries, io.StringIO())
+
+
+def export_store(store):
+	cg.write_json(store, io.StringIO())
+
+
+if __name__ == "__main__":
+	events = cg.parse_wiki_page(synthetic.make_page(ROWS))
+	entries = cg.expand_dates(events)
+	store = cg.OccurrenceStore(events)
+	n = len(entries)
+	synthetic.report("time.mktime (%d entries)" % n, synthetic.timeit(export_mktime, entries), n)
+	synthetic.report("sort key timestamps", synthetic.timeit(export, entries), n)
+	synthetic.report("OccurrenceStore", synthetic.timeit(export_store, store), n)
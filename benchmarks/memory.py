@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -.- encoding: utf-8 -.-
+# memory of expanded weekly series measured with tracemalloc, and the time
+# it takes to expand and render them
+# run with `python -m benchmarks.memory`
+import gc
+import io
+import tracemalloc
+import calendargenerator as cg
+from . import synthetic
+
+ROWS = 1000
+
+
+def expand(events):
+	for event in events:
+		if isinstance(event, cg.Generator):
+			event._entries = None
+	entries = cg.expand_dates(events)
+	for entry in entries:
+		entry.sort_key()
+	return entries
+
+
+def render(entries):
+	cg.write_json(entries, io.StringIO())
+	for entry in entries:
+		entry.getMediawikiEntry()
+
+
+if __name__ == "__main__":
+	events = cg.parse_wiki_page(synthetic.make_page(ROWS))
+	gc.collect()
+	tracemalloc.start()
+	before = tracemalloc.get_traced_memory()[0]
+	entries = expand(events)
+	gc.collect()
+	size = tracemalloc.get_traced_memory()[0] - before
+	tracemalloc.stop()
+	n = len(entries)
+	print("%-40s %8.1f KiB per 10k occurrences" % ("expanded entries (%d)" % n, size / n * 10000 / 1024))
+
+	synthetic.report("expand (%d entries)" % n, synthetic.timeit(expand, events), n)
+	synthetic.report("render (%d entries)" % n, synthetic.timeit(render, entries), n)
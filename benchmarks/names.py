@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -.- encoding: utf-8 -.-
+# generate_json_css and next_up with and without the per-name caches of
+# plain_name/name_url, `--profile` prints a cProfile of the cached run
+# run with `python -m benchmarks.names`
+import cProfile
+import datetime
+import os
+import pstats
+import sys
+import tempfile
+import calendargenerator as cg
+from . import synthetic
+
+ROWS = 2000
+
+
+def run(entries, now, outdir):
+	for entry in entries:
+		entry._plain_name = None
+		entry._url = None
+	cg.generate_json_css(entries, os.path.join(outdir, "events.json"), os.path.join(outdir, "category.css"))
+	cg.next_up(entries, now)
+
+
+if __name__ == "__main__":
+	entries = cg.expand_dates(cg.parse_wiki_page(synthetic.make_page(ROWS)))
+	now = cg.tz.localize(datetime.datetime(2017, 6, 1, 12, 0))
+	outdir = tempfile.mkdtemp()
+	n = len(entries)
+	names = len(set(entry.name for entry in entries))
+	print("%d entries, %d distinct names" % (n, names))
+
+	cached = (cg.plain_name, cg.name_url)
+	cg.plain_name, cg.name_url = cg.plain_name.__wrapped__, cg.name_url.__wrapped__
+	synthetic.report("uncached", synthetic.timeit(run, entries, now, outdir), n)
+	cg.plain_name, cg.name_url = cached
+	synthetic.report("cached", synthetic.timeit(run, entries, now, outdir), n)
+	print(cg.plain_name.cache_info())
+
+	if "--profile" in sys.argv:
+		profile = cProfile.Profile()
+		profile.runcall(run, entries, now, outdir)
+		pstats.Stats(profile).sort_stats("cumulative").print_stats(15)
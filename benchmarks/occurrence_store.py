@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -.- encoding: utf-8 -.-
+# starts of weekly series from the rrule vs. week arithmetic, and expanded
+# events as objects (expand_dates) vs. the arrays of an OccurrenceStore:
+# building them, the wiki sections and the json export
+# run with `python -m benchmarks.occurrence_store`
+import datetime
+import io
+import calendargenerator as cg
+from . import synthetic
+
+ROWS = 8000
+
+
+def expand_list(events):
+	for event in events:
+		if isinstance(event, cg.Generator):
+			event._entries = None
+	return cg.expand_dates(events)
+
+
+def rule_timestamps(series):
+	for s in series:
+		[s.timestamp(event) for event in s.rule]
+
+
+def week_timestamps(series):
+	for s in series:
+		s.timestamps()
+
+
+def wiki_sections(entries, now):
+	index = cg.EventIndex(entries)
+	cg.next_up(index, now)
+	cg.in_before(index, now)
+	index.next_change(now)
+
+
+def with_list(events, now):
+	wiki_sections(expand_list(events), now)
+
+
+def with_store(events, now):
+	wiki_sections(cg.OccurrenceStore(events), now)
+
+
+if __name__ == "__main__":
+	events = cg.parse_wiki_page(synthetic.make_page(ROWS))
+	now = cg.tz.localize(datetime.datetime(2017, 6, 1, 12, 0))
+	entries = expand_list(events)
+	store = cg.OccurrenceStore(events)
+	n = len(store)
+	series = [event.series for event in events if isinstance(event, cg.WeekdayTimeRangeGenerator) and event.rule is not None]
+	synthetic.report("starts from the rrule (%d series)" % len(series), synthetic.timeit(rule_timestamps, series), n)
+	synthetic.report("starts from week arithmetic", synthetic.timeit(week_timestamps, series), n)
+	synthetic.report("expand_dates (%d entries)" % n, synthetic.timeit(expand_list, events), n)
+	synthetic.report("OccurrenceStore (%d rows)" % n, synthetic.timeit(cg.OccurrenceStore, events), n)
+	synthetic.report("EventIndex of the store", synthetic.timeit(cg.EventIndex, store), n)
+	synthetic.report("expand + next_up, list", synthetic.timeit(with_list, events, now), n)
+	synthetic.report("expand + next_up, store", synthetic.timeit(with_store, events, now), n)
+	synthetic.report("json, list", synthetic.timeit(cg.write_json, entries, io.StringIO(), repeat=1), n)
+	synthetic.report("json, store", synthetic.timeit(cg.write_json, store, io.StringIO(), repeat=1), n)
@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+# -.- encoding: utf-8 -.-
+# tokenize_wiki_page of a large page (e.g. an archive of several years) with
+# 1, 2, 4 and 8 worker processes
+# run with `python -m benchmarks.parallel_parse`
+import os
+import calendargenerator as cg
+from . import synthetic
+
+ROWS = 40000
+
+
+if __name__ == "__main__":
+	content = synthetic.make_page(ROWS, years=(2010, 2020), title="= Termine Archiv =")
+	print("%d cpus" % os.cpu_count())
+	for workers in (1, 2, 4, 8):
+		synthetic.report("%d workers (%d rows)" % (workers, ROWS), synthetic.timeit(cg.tokenize_wiki_page, content, workers, repeat=1), ROWS)
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+# -.- encoding: utf-8 -.-
+# parsing and expanding a page vs. loading it from the ParseCache
+# run with `python -m benchmarks.parse_cache`
+import shutil
+import tempfile
+import calendargenerator as cg
+from . import synthetic
+
+ROWS = 5000
+
+
+def parse(content):
+	cg.expand_dates(cg.parse_wiki_page(content))
+
+
+def load(cache, content):
+	cg.expand_dates(cache.parse(content))
+
+
+if __name__ == "__main__":
+	content = synthetic.make_page(ROWS)
+	directory = tempfile.mkdtemp()
+	try:
+		cache = cg.ParseCache(directory)
+		cache.tokenize(content)
+		synthetic.report("parse + expand (%d rows)" % ROWS, synthetic.timeit(parse, content), ROWS)
+		synthetic.report("cache hit (%d rows)" % ROWS, synthetic.timeit(load, cache, content), ROWS)
+	finally:
+		shutil.rmtree(directory)
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+# -.- encoding: utf-8 -.-
+# sorting expanded entries with the comparison operators vs. cached sort keys
+# run with `python -m benchmarks.sort_entries`
+import calendargenerator as cg
+from . import synthetic
+
+ENTRIES = 10000
+
+
+def sort_compare(entries):
+	sorted(entries)
+
+
+def sort_key(entries):
+	for entry in entries:
+		entry._sort_key = None
+	sorted(entries, key=cg.entry_sort_key)
+
+
+if __name__ == "__main__":
+	entries = cg.expand_dates(cg.parse_wiki_page(synthetic.make_page(1000)))[:ENTRIES]
+	n = len(entries)
+	synthetic.report("comparison operators (%d entries)" % n, synthetic.timeit(sort_compare, entries), n)
+	synthetic.report("sort keys (%d entries)" % n, synthetic.timeit(sort_key, entries), n)
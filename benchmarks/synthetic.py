@@ -0,0 +1,70 @@
+# -.- encoding: utf-8 -.-
+import random
+import time
+
+ROWS_PER_CATEGORY = 50
+
+weekdays = ["Mo", "Di", "Mi", "Do", "Fr", "Sa", "So"]
+
+
+def random_cell(rnd, year):
+	day = rnd.randint(1, 26)
+	month = rnd.randint(1, 12)
+	hour = rnd.randint(8, 20)
+	kind = rnd.randint(0, 6)
+	if kind == 0:
+		return "%02d.%02d.%d" % (day, month, year), ""
+	if kind == 1:
+		return "%02d.%02d.%d %02d:00" % (day, month, year, hour), ""
+	if kind == 2:
+		return "%02d.%02d.%d %02d:00-%02d:30" % (day, month, year, hour, hour + 2), ""
+	if kind == 3:
+		return "%02d.%02d.%d - %02d.%02d.%d" % (day, month, year, day + 2, month, year), ""
+	if kind == 4:
+		return "%02d.%02d.%d %02d:00 - %02d.%02d.%d 12:00" % (day, month, year, hour, day + 1, month, year), ""
+	rep = "%02d.%02d.%d - %02d.%02d.%d" % (day, month, year, day, month, year + 1)
+	if kind == 5:
+		return "%s, %02d:00" % (rnd.choice(weekdays), hour), rep
+	return "%s/2, %02d:00 - %02d:00" % (rnd.choice(weekdays), hour, hour + 3), rep
+
+
+def make_rows(n, seed=0, years=(2014, 2020)):
+	rnd = random.Random(seed)
+	rows = []
+	for i in range(n):
+		date, rep = random_cell(rnd, rnd.randint(*years))
+		rows.append(("Event %d [[Link %d]]" % (i % 97, i % 13), date, rep))
+	return rows
+
+
+def make_page(n, seed=0, years=(2014, 2020), title="= Termine ="):
+	lines = [title]
+	for i, (name, date, rep) in enumerate(make_rows(n, seed, years)):
+		if i % ROWS_PER_CATEGORY == 0:
+			if i:
+				lines.append("|}")
+			lines.append("== Category %d ==" % (i // ROWS_PER_CATEGORY))
+			lines.append("{| class=\"prettytable\"")
+			lines.append("! Event !! Termin !! Im Zeitraum")
+		lines.append("|-")
+		lines.append("| %s || %s || %s" % (name, date, rep))
+	lines.append("|}")
+	return "\n".join(lines)
+
+
+def timeit(func, *args, repeat=3):
+	best = None
+	for _ in range(repeat):
+		start = time.perf_counter()
+		func(*args)
+		duration = time.perf_counter() - start
+		if best is None or duration < best:
+			best = duration
+	return best
+
+
+def report(label, seconds, n=None):
+	if n:
+		print("%-40s %8.3f s  (%.2f us/item)" % (label, seconds, seconds / n * 1e6))
+	else:
+		print("%-40s %8.3f s" % (label, seconds))
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -.- encoding: utf-8 -.-
+# generate_wiki_section with the weekday tables vs. the old setlocale lookup
+# run with `python -m benchmarks.wiki_section`
+import calendar
+import datetime
+import locale
+import calendargenerator as cg
+from . import synthetic
+
+ROWS = 5000
+TEMPLATE = "templates/termine_haupt.de.wiki"
+
+
+def day_of_week_str_setlocale(day_of_week, lang=cg.LANG_EN):
+	locale.setlocale(locale.LC_ALL, lang)
+	return calendar.day_abbr[day_of_week].title()
+
+
+def render(entries, now):
+	for lang in (cg.LANG_DE, cg.LANG_EN, cg.LANG_FR):
+		cg.generate_wiki_section(entries, TEMPLATE, lang, now=now)
+		for entry in entries:
+			entry.getDetailPlain(lang)
+
+
+if __name__ == "__main__":
+	entries = cg.expand_dates(cg.parse_wiki_page(synthetic.make_page(ROWS)))
+	now = cg.tz.localize(datetime.datetime(2017, 6, 1, 12, 0))
+	n = len(entries) * 3
+	synthetic.report("weekday tables (%d entries)" % len(entries), synthetic.timeit(render, entries, now), n)
+	table_lookup = cg.day_of_week_str
+	cg.day_of_week_str = day_of_week_str_setlocale
+	try:
+		synthetic.report("setlocale (%d entries)" % len(entries), synthetic.timeit(render, entries, now), n)
+	except locale.Error as e:
+		print("setlocale: %s" % e)
+	finally:
+		cg.day_of_week_str = table_lookup
+		locale.setlocale(locale.LC_ALL, "C")
@@ -1,50 +1,109 @@
 #!/usr/bin/env python3
 # -.- encoding: utf-8 -.-
-import mwclient
+import wikiclient
 import datetime
 import time
-import config
 import calendargenerator
 import os
+import concurrent.futures
+import json
 
-if __name__ == "__main__":
-	site = mwclient.Site((config.protocol, config.server), path="/mediawiki/")
-
-	termine = site.Pages["Termine"]
-	comment = None
-	entries = calendargenerator.parse_wiki_page(termine.text())
-	expanded_entries = calendargenerator.expand_dates(entries)
-
-	def update(entries, page, purge_page, templatefile, lang):
-		global comment
-		templatefile = os.path.join(os.path.dirname(__file__), templatefile)
-		page_data = site.Pages[page]
-		old = page_data.text()
-		text = calendargenerator.generate_wiki_section(entries, templatefile, lang)
-		if old != text:
+import pytz
+
+SECTIONS = [
+	("Template:Termine/de", "Hauptseite", "templates/termine_haupt.de.wiki", calendargenerator.LANG_DE),
+	("Template:Termine/en", "English", "templates/termine_haupt.en.wiki", calendargenerator.LANG_EN),
+	("Template:Termine/fr", u"Français", "templates/termine_haupt.fr.wiki", calendargenerator.LANG_FR)]
+
+
+def edit_comment(rev):
+	changed = datetime.datetime.fromtimestamp(time.mktime(rev["timestamp"]))
+	now = datetime.datetime.utcnow()
+	comment = u"Automatisches Update (irgendwas wird sich schon verändert haben)"
+	if (now - changed) < datetime.timedelta(minutes=15):
+		comment = u"%s hat Termine aktualisiert (%s) " % (rev["user"], rev["comment"])
+	return comment
+
+
+def load_state(filename):
+	try:
+		with open(filename) as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return {}
+
+
+def up_to_date(state, revid, now):
+	# nothing to do if Termine was not edited, the code did not change and
+	# the wiki sections will look the same as in the last run. next_change
+	# is None if they will never change.
+	# a state without some of the keys (older format, edited by hand) is
+	# not up to date
+	if not isinstance(state, dict) or "next_change" not in state:
+		return False
+	if state.get("revid") != revid or state.get("version") != calendargenerator.parser_version():
+		return False
+	return state["next_change"] is None or now.timestamp() < state["next_change"]
+
+
+def run(site, config):
+	now = datetime.datetime.utcnow().replace(tzinfo=pytz.utc).astimezone(calendargenerator.tz)
+	state_file = getattr(config, "state", None)
+	if state_file:
+		state = load_state(state_file)
+		if up_to_date(state, site.revision_ids(["Termine"])["Termine"], now):
+			print("nothing to do")
+			return
+
+	# Termine and the templates are fetched together with the last revision
+	# of Termine, a run without changes only needs this one request
+	pages = site.fetch(["Termine"] + [page for page, _, _, _ in SECTIONS])
+	termine = pages["Termine"]
+	if getattr(config, "parse_cache", None):
+		entries = calendargenerator.ParseCache(config.parse_cache).parse(termine["text"])
+	else:
+		entries = calendargenerator.parse_wiki_page(termine["text"])
+	# all occurrences as arrays, entries are only created for the rows that
+	# are rendered
+	occurrences = calendargenerator.OccurrenceStore(entries)
+	index = calendargenerator.EventIndex(occurrences)
+
+	# the sections are rendered concurrently
+	with concurrent.futures.ThreadPoolExecutor(getattr(config, "workers", 4)) as executor:
+		texts = calendargenerator.generate_wiki_sections(index, [(os.path.join(os.path.dirname(os.path.abspath(__file__)), templatefile), lang) for _, _, templatefile, lang in SECTIONS], now, executor)
+
+	updates = []
+	for (page, purge_page, _, _), text in zip(SECTIONS, texts):
+		if pages[page]["text"] != text:
 			print("updating %s" % page)
-			if not comment:
-				rev = termine.revisions(limit=1, prop='timestamp|user|comment').next()
-				changed = datetime.datetime.fromtimestamp(time.mktime(rev["timestamp"]))
-				now = datetime.datetime.utcnow()
-				comment = u"Automatisches Update (irgendwas wird sich schon verändert haben)"
-				if (now - changed) < datetime.timedelta(minutes=15):
-					comment = u"%s hat Termine aktualisiert (%s) " % (rev["user"], rev["comment"])
-			print(comment)
-			if not site.logged_in:
-				site.login(config.user, config.password)
-			if config.write_wiki:
-				page_data.save(text, comment, minor=True)
-				try:
-					site.Pages[purge_page].purge()
-				except mwclient.errors.HTTPRedirectError:
-					pass
-			else:
-				print("no write")
-
-	update(expanded_entries, "Template:Termine/de", "Hauptseite", "templates/termine_haupt.de.wiki", calendargenerator.LANG_DE)
-	update(expanded_entries, "Template:Termine/en", "English", "templates/termine_haupt.en.wiki", calendargenerator.LANG_EN)
-	update(expanded_entries, "Template:Termine/fr", u"Français", "templates/termine_haupt.fr.wiki", calendargenerator.LANG_FR)
-
-	calendargenerator.generate_ical(entries, config.ical)
-	calendargenerator.generate_json_css(expanded_entries, config.json, config.css)
+			updates.append((page, text, purge_page))
+	written = True
+	if updates:
+		comment = edit_comment(termine)
+		print(comment)
+		if not site.logged_in:
+			site.login(config.user, config.password)
+		if config.write_wiki:
+			# the edits share one token and are sent together, followed
+			# by a single purge of all affected pages
+			site.save_many([(page, text, comment, True) for page, text, _ in updates])
+			site.purge([purge_page for _, _, purge_page in updates])
+		else:
+			written = False
+			print("no write")
+
+	manifest = calendargenerator.OutputManifest(os.path.dirname(os.path.abspath(config.ical)))
+	compress = getattr(config, "compress", ())
+	headers = getattr(config, "headers", False)
+	calendargenerator.generate_ical(entries, config.ical, manifest, streaming=getattr(config, "ical_streaming", False), compress=compress, headers=headers)
+	calendargenerator.generate_json_css(occurrences, config.json, config.css, manifest, shards=getattr(config, "json_shards", None), compress=compress, headers=headers)
+
+	if state_file and written:
+		next_change = index.next_change(now)
+		state = {"revid": termine["revid"], "version": calendargenerator.parser_version(), "next_change": next_change.timestamp() if next_change else None}
+		calendargenerator.write_file(state_file, json.dumps(state))
+
+
+if __name__ == "__main__":
+	import config
+	run(wikiclient.Site((config.protocol, config.server), path="/mediawiki/"), config)
@@ -2,18 +2,32 @@
 # -.- encoding: utf-8 -.-
 import re
 import datetime
-import time
 from dateutil import rrule
 import icalendar as ical
 import pytz
-import calendar
-import locale
 import hashlib
+import bisect
 import string
 import os
 import json
 import sys
 import urllib.parse
+import functools
+import io
+import pickle
+import zlib
+import tempfile
+import filecmp
+import gzip
+import email.utils
+import abc
+import array
+import itertools
+import multiprocessing
+try:
+	import brotli
+except ImportError:
+	brotli = None
 
 
 TIMEZONE = 'Europe/Berlin'
@@ -23,6 +37,14 @@ MAX_NEXT_UP_REPEATED_DAYS = 4 * 7
 MAX_NEXT_UP_DAYS = 31 * 3
 MAX_IN_BEFORE_REPEATED = 1
 MAX_IN_BEFORE_DAYS = 31
+NAME_CACHE_SIZE = 4096
+DATE_CACHE_SIZE = 4096
+LINE_CHUNK_SIZE = 64 * 1024
+PARALLEL_CHUNK_LINES = 2000  # smallest part of a page tokenized by a worker
+PARSE_CACHE_VERSION = 1  # bump when parsed objects change
+PARSE_CACHE_ENTRIES = 16
+PARSE_CACHE_BYTES = 64 * 1024 * 1024
+MANIFEST_NAME = ".calendar-manifest.json"
 
 T_CATEGORY = "category"
 T_EVENT = "date"
@@ -75,6 +97,13 @@ dow_index = {
 
 dow_list = ["Mo", "Di", "Mi", "Do", "Fr", "Sa", "So"]
 
+# abbreviated weekday names as given by the glibc locales, so rendering
+# does not need setlocale (and the locales do not need to be installed)
+weekday_names = {
+	"de": dow_list,
+	"en": ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"],
+	"fr": ["Lun", "Mar", "Mer", "Jeu", "Ven", "Sam", "Dim"]}
+
 
 def simple_name(name):
 	name = name.lower()
@@ -87,8 +116,8 @@ def simple_name(name):
 
 
 def day_of_week_str(day_of_week, lang=LANG_EN):
-	locale.setlocale(locale.LC_ALL, lang)
-	return calendar.day_abbr[day_of_week].title()
+	names = weekday_names.get(short_lang(lang), weekday_names["en"])
+	return names[day_of_week]
 
 
 def short_lang(lang):
@@ -111,27 +140,105 @@ def make_extern(intern_url):
 	return "https://stratum0.org/wiki/%s" % urllib.parse.quote(intern_url)
 
 
+@functools.lru_cache(maxsize=NAME_CACHE_SIZE)
+def plain_name(name):
+	def fix_intern(match):
+		_, url, name = match.groups()
+		if name:
+			return name
+		return url
+	name = mediawiki_intern_link.sub(fix_intern, name)
+	name = mediawiki_extern_link.sub(r"\3", name)
+	name = mediawiki_bold.sub(r"\1", name)
+	name = mediawiki_emph.sub(r"\1", name)
+	return name
+
+
+@functools.lru_cache(maxsize=NAME_CACHE_SIZE)
+def name_url(name):
+	urls_intern = mediawiki_intern_link.findall(name)
+	urls_extern = mediawiki_extern_link.findall(name)
+	extern_url = None
+	intern_url = None
+	if urls_extern:
+		extern_url = urls_extern[0]
+	if urls_intern:
+		intern_url = urls_intern[0]
+	if extern_url and intern_url:
+		if name.index(extern_url[0]) < name.index(intern_url[0]):
+			intern_url = None
+		else:
+			extern_url = None
+	if intern_url:
+		if intern_url[1]:
+			return make_extern(intern_url[1])
+		return make_extern(intern_url[2])
+	if extern_url:
+		return extern_url[1]
+	return None
+
+
+def ical_text(text):
+	return text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\r\n", "\\n").replace("\n", "\\n")
+
+
+def ical_date(value):
+	if isinstance(value, datetime.datetime):
+		return ";TZID=%s:%s" % (TIMEZONE, value.strftime("%Y%m%dT%H%M%S"))
+	return ";VALUE=DATE:%s" % value.strftime("%Y%m%d")
+
+
+def ical_fold(line):
+	# folds like icalendar: at most 74 octets per line (plus the leading
+	# space of continuation lines), never inside a utf-8 sequence
+	if len(line) < 75 and len(line.encode("utf8")) < 75:
+		return line
+	parts = []
+	start = 0
+	size = 0
+	for i, char in enumerate(line):
+		char_size = len(char.encode("utf8"))
+		size += char_size
+		if size >= 75:
+			parts.append(line[start:i])
+			start = i
+			size = char_size
+	parts.append(line[start:])
+	return "\r\n ".join(parts)
+
+
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
 def date2datetime(date):
 	return tz.localize(datetime.datetime(date.year, date.month, date.day, 0, 0))
 
 
+def intern_text(text):
+	# the category is None for events before the first category
+	if text is None:
+		return None
+	return sys.intern(text)
+
+
+def entry_sort_key(entry):
+	return entry.sort_key()
+
+
 class InvalidDateEntryException(Exception):
 	pass
 
 
-class DatePrinter(object):
-	def __init__(self, name, category, start_date, end_date):
-		self.name = name
-		self.rule = None
-		self.start_date = start_date
-		self.end_date = end_date
-		self.category = category
-		if self.end_date <= self.start_date:
-			raise InvalidDateEntryException
+class DatePrinter(object, metaclass=abc.ABCMeta):
+	# the methods of all entries. no slots of its own: the entries of the
+	# wiki page keep their dates in DateRecord, occurrences of a Series only
+	# their start (Occurrence)
+	__slots__ = ()
+
+	def getIcalUid(self):
+		return hashlib.md5(self.name.encode("utf8") + str(self.start_date).encode("utf8")).hexdigest() + "@stratum0.org"
 
 	def getIcal(self):
 		event = ical.Event()
-		event.add('uid', hashlib.md5(self.name.encode("utf8") + str(self.start_date).encode("utf8")).hexdigest() + "@stratum0.org")
+		event.add('uid', self.getIcalUid())
 		event.add('summary', self.getPlainName().encode("utf8"))
 		url = self.getURL()
 		if url:
@@ -140,19 +247,37 @@ class DatePrinter(object):
 		event.add('dtend', self.end_date)
 		return event
 
+	def getIcalLines(self):
+		# the properties of getIcal() as unfolded content lines
+		lines = [
+			"SUMMARY:%s" % ical_text(self.getPlainName()),
+			"DTSTART%s" % ical_date(self.start_date),
+			"DTEND%s" % ical_date(self.end_date),
+			"UID:%s" % self.getIcalUid()]
+		url = self.getURL()
+		if url:
+			lines.append("URL:%s" % url)
+		return lines
+
 	def getJson(self):
 		result = {}
 		result["id"] = hashlib.md5(self.getPlainName().encode("utf8")).hexdigest()
 		result["title"] = self.getDetailPlain()
 		result["url"] = self.getURL()
 		result["class"] = "event-%s" % simple_name(self.category)
-		result["start"] = int(time.mktime(self.start_date.timetuple()) * 1000)
-		result["end"] = int(time.mktime(self.end_date.timetuple()) * 1000) - 1
+		# from the utc timestamps of the sort key, not the timezone of the
+		# process like time.mktime
+		end, start, _ = self.sort_key()
+		result["start"] = int(start * 1000)
+		result["end"] = int(end * 1000) - 1
 		return result
 
 	def getMediawikiRow(self):
 		return ("| %s || %s ||" % (self.getMediawikiName(), self.getDateString()))
 
+	def fingerprint(self):
+		return "%s|%s|%s|%s|%s" % (self.__class__.__name__, self.name, self.category, self.start_date, self.end_date)
+
 	def getDateString(self):
 		raise Exception("not implemented")
 
@@ -169,48 +294,33 @@ class DatePrinter(object):
 		return self.name
 
 	def getPlainName(self):
-		def fix_intern(match):
-			_, url, name = match.groups()
-			if name:
-				return name
-			return url
-		name = mediawiki_intern_link.sub(fix_intern, self.name)
-		name = mediawiki_extern_link.sub(r"\3", name)
-		name = mediawiki_bold.sub(r"\1", name)
-		name = mediawiki_emph.sub(r"\1", name)
-		return name
+		if self._plain_name is None:
+			self._plain_name = plain_name(self.name)
+		return self._plain_name
 
 	def getURL(self):
-		urls_intern = mediawiki_intern_link.findall(self.name)
-		urls_extern = mediawiki_extern_link.findall(self.name)
-		extern_url = None
-		intern_url = None
-		if urls_extern:
-			extern_url = urls_extern[0]
-		if urls_intern:
-			intern_url = urls_intern[0]
-		if extern_url and intern_url:
-			if self.name.index(extern_url[0]) < self.name.index(intern_url[0]):
-				intern_url = None
-			else:
-				extern_url = None
-		if intern_url:
-			if intern_url[1]:
-				return make_extern(intern_url[1])
-			return make_extern(intern_url[2])
-		if extern_url:
-			return extern_url[1]
-		return None
+		if self._url is None:
+			self._url = (name_url(self.name),)
+		return self._url[0]
 
 	def start_datetime(self):
-		if type(self.start_date) is datetime.date:
-			return date2datetime(self.start_date)
-		return self.start_date
+		start = self.start_date
+		if type(start) is datetime.date:
+			return date2datetime(start)
+		return start
 
 	def end_datetime(self):
-		if type(self.end_date) is datetime.date:
-			return date2datetime(self.end_date)
-		return self.end_date
+		end = self.end_date
+		if type(end) is datetime.date:
+			return date2datetime(end)
+		return end
+
+	def sort_key(self):
+		# sorting by end, start and name gives the order of the comparison
+		# operators below without creating datetimes for every comparison
+		if self._sort_key is None:
+			self._sort_key = (self.end_datetime().timestamp(), self.start_datetime().timestamp(), self.name)
+		return self._sort_key
 
 	def __lt__(self, other):
 		if isinstance(other, datetime.datetime):
@@ -248,133 +358,233 @@ class DatePrinter(object):
 		return self > other or self == other
 
 
-class SingleDate(DatePrinter):
+class DateRecord(DatePrinter):
+	# a DatePrinter with its own dates. there are a lot of these, so no
+	# __dict__ and shared strings
+	__slots__ = ("name", "category", "rule", "start_date", "end_date", "_sort_key", "_plain_name", "_url")
+
+	def __init__(self, name, category, start_date, end_date):
+		self.name = sys.intern(name)
+		self.rule = None
+		self.start_date = start_date
+		self.end_date = end_date
+		self.category = intern_text(category)
+		self._sort_key = None
+		self._plain_name = None
+		self._url = None
+		if self.end_date <= self.start_date:
+			raise InvalidDateEntryException
+
+
+class SingleDate(DateRecord):
+	__slots__ = ()
+
 	def __init__(self, name, category, values):
 		day, month, year = map(int, values)
 		date = datetime.date(year, month, day)
 		date_end = date + datetime.timedelta(days=1)
-		DatePrinter.__init__(self, name, category, date, date_end)
+		DateRecord.__init__(self, name, category, date, date_end)
+
+	def getDetailPlain(self, lang=LANG_DE):
+		start = self.start_date
+		dow = day_of_week_str(start.weekday(), lang)
+		return "%s, %02d.%02d.: %s" % (dow, start.day, start.month, self.getPlainName())
+
+	def getMediawikiEntry(self, lang=LANG_DE):
+		start = self.start_date
+		dow = day_of_week_str(start.weekday(), lang)
+		return "* %s, %02d.%02d.: %s" % (dow, start.day, start.month, self.getMediawikiName())
+
+	def getDateString(self):
+		start = self.start_date
+		return "%02d.%02d.%02d" % (start.day, start.month, start.year)
+
+
+class SingleDateTimeFormat(DatePrinter):
+	__slots__ = ()
 
 	def getDetailPlain(self, lang=LANG_DE):
-		dow = day_of_week_str(self.start_date.weekday(), lang)
-		return "%s, %02d.%02d.: %s" % (dow, self.start_date.day, self.start_date.month, self.getPlainName())
+		start = self.start_date
+		dow = day_of_week_str(start.weekday(), lang)
+		return "%s, %02d.%02d. %02d:%02d: %s" % (dow, start.day, start.month, start.hour, start.minute, self.getPlainName())
 
 	def getMediawikiEntry(self, lang=LANG_DE):
-		dow = day_of_week_str(self.start_date.weekday(), lang)
-		return "* %s, %02d.%02d.: %s" % (dow, self.start_date.day, self.start_date.month, self.getMediawikiName())
+		start = self.start_date
+		dow = day_of_week_str(start.weekday(), lang)
+		return "* %s, %02d.%02d. %02d:%02d: %s" % (dow, start.day, start.month, start.hour, start.minute, self.getMediawikiName())
 
 	def getDateString(self):
-		return "%02d.%02d.%02d" % (self.start_date.day, self.start_date.month, self.start_date.year)
+		start = self.start_date
+		return "%02d.%02d.%02d %02d:%02d" % (start.day, start.month, start.year, start.hour, start.minute)
 
 
-class SingleDateTime(DatePrinter):
+class SingleDateTime(SingleDateTimeFormat, DateRecord):
+	__slots__ = ()
+
 	def __init__(self, name, category, values):
 		day, month, year, hour, minute = map(int, values)
 		date = tz.localize(datetime.datetime(year, month, day, hour, minute))
 		date_end = date + datetime.timedelta(hours=DEFAULT_DURATION)
-		DatePrinter.__init__(self, name, category, date, date_end)
+		DateRecord.__init__(self, name, category, date, date_end)
+
+
+class SingleDateTimeRangeFormat(DatePrinter):
+	__slots__ = ()
 
 	def getDetailPlain(self, lang=LANG_DE):
-		dow = day_of_week_str(self.start_date.weekday(), lang)
-		return "%s, %02d.%02d. %02d:%02d: %s" % (dow, self.start_date.day, self.start_date.month, self.start_date.hour, self.start_date.minute, self.getPlainName())
+		start = self.start_date
+		end = self.end_date
+		dow = day_of_week_str(start.weekday(), lang)
+		return "%s, %02d.%02d. %02d:%02d - %02d:%02d: %s" % (dow, start.day, start.month, start.hour, start.minute, end.hour, end.minute, self.getPlainName())
 
 	def getMediawikiEntry(self, lang=LANG_DE):
-		dow = day_of_week_str(self.start_date.weekday(), lang)
-		return "* %s, %02d.%02d. %02d:%02d: %s" % (dow, self.start_date.day, self.start_date.month, self.start_date.hour, self.start_date.minute, self.getMediawikiName())
+		start = self.start_date
+		end = self.end_date
+		dow = day_of_week_str(start.weekday(), lang)
+		return "* %s, %02d.%02d. %02d:%02d - %02d:%02d: %s" % (dow, start.day, start.month, start.hour, start.minute, end.hour, end.minute, self.getMediawikiName())
 
 	def getDateString(self):
-		return "%02d.%02d.%02d %02d:%02d" % (self.start_date.day, self.start_date.month, self.start_date.year, self.start_date.hour, self.start_date.minute)
+		start = self.start_date
+		end = self.end_date
+		return "%02d.%02d.%02d %02d:%02d - %02d:%02d" % (start.day, start.month, start.year, start.hour, start.minute, end.hour, end.minute)
 
 
-class SingleDateTimeRange(DatePrinter):
+class SingleDateTimeRange(SingleDateTimeRangeFormat, DateRecord):
+	__slots__ = ()
+
 	def __init__(self, name, category, values):
 		day, month, year, hour, minute, hour2, minute2 = map(int, values)
 		date = tz.localize(datetime.datetime(year, month, day, hour, minute))
 		date_end = tz.localize(datetime.datetime(year, month, day, hour2, minute2))
 		if date_end < date:
 			date_end += datetime.timedelta(days=1)
-		DatePrinter.__init__(self, name, category, date, date_end)
-
-	def getDetailPlain(self, lang=LANG_DE):
-		dow = day_of_week_str(self.start_date.weekday(), lang)
-		return "%s, %02d.%02d. %02d:%02d - %02d:%02d: %s" % (dow, self.start_date.day, self.start_date.month, self.start_date.hour, self.start_date.minute, self.end_date.hour, self.end_date.minute, self.getPlainName())
-
-	def getMediawikiEntry(self, lang=LANG_DE):
-		dow = day_of_week_str(self.start_date.weekday(), lang)
-		return "* %s, %02d.%02d. %02d:%02d - %02d:%02d: %s" % (dow, self.start_date.day, self.start_date.month, self.start_date.hour, self.start_date.minute, self.end_date.hour, self.end_date.minute, self.getMediawikiName())
+		DateRecord.__init__(self, name, category, date, date_end)
 
-	def getDateString(self):
-		return "%02d.%02d.%02d %02d:%02d - %02d:%02d" % (self.start_date.day, self.start_date.month, self.start_date.year, self.start_date.hour, self.start_date.minute, self.end_date.hour, self.end_date.minute)
 
+class DateRange(DateRecord):
+	__slots__ = ("end_date2",)
 
-class DateRange(DatePrinter):
 	def __init__(self, name, category, values):
 		day, month, year, day2, month2, year2 = map(int, values)
 		date = datetime.date(year, month, day)
 		date_end = datetime.date(year2, month2, day2) + datetime.timedelta(days=1)
 		self.end_date2 = datetime.date(year2, month2, day2)
-		DatePrinter.__init__(self, name, category, date, date_end)
+		DateRecord.__init__(self, name, category, date, date_end)
 
 	def getDetailPlain(self, lang=LANG_DE):
-		dow = day_of_week_str(self.start_date.weekday(), lang)
+		start = self.start_date
+		dow = day_of_week_str(start.weekday(), lang)
 		dow2 = day_of_week_str(self.end_date2.weekday(), lang)
 		to = to_in_lang(lang)
-		return "%s, %02d.%02d. %s %s, %02d.%02d.: %s" % (dow, self.start_date.day, self.start_date.month, to, dow2, self.end_date2.day, self.end_date2.month, self.getPlainName())
+		return "%s, %02d.%02d. %s %s, %02d.%02d.: %s" % (dow, start.day, start.month, to, dow2, self.end_date2.day, self.end_date2.month, self.getPlainName())
 
 	def getMediawikiEntry(self, lang=LANG_DE):
-		dow = day_of_week_str(self.start_date.weekday(), lang)
+		start = self.start_date
+		dow = day_of_week_str(start.weekday(), lang)
 		dow2 = day_of_week_str(self.end_date2.weekday(), lang)
 		to = to_in_lang(lang)
-		return "* %s, %02d.%02d. %s %s, %02d.%02d.: %s" % (dow, self.start_date.day, self.start_date.month, to, dow2, self.end_date2.day, self.end_date2.month, self.getMediawikiName())
+		return "* %s, %02d.%02d. %s %s, %02d.%02d.: %s" % (dow, start.day, start.month, to, dow2, self.end_date2.day, self.end_date2.month, self.getMediawikiName())
 
 	def getDateString(self):
-		return "%02d.%02d.%02d - %02d.%02d.%02d" % (self.start_date.day, self.start_date.month, self.start_date.year, self.end_date2.day, self.end_date2.month, self.end_date2.year)
+		start = self.start_date
+		return "%02d.%02d.%02d - %02d.%02d.%02d" % (start.day, start.month, start.year, self.end_date2.day, self.end_date2.month, self.end_date2.year)
 
 
-class DateTimeRange(DatePrinter):
-	def __init__(self, name, category, values):
-		day, month, year, hour, minute, day2, month2, year2, hour2, minute2 = map(int, values)
-		date = tz.localize(datetime.datetime(year, month, day, hour, minute))
-		date_end = tz.localize(datetime.datetime(year2, month2, day2, hour2, minute2))
-		DatePrinter.__init__(self, name, category, date, date_end)
+class DateTimeRangeFormat(DatePrinter):
+	__slots__ = ()
 
 	def getDetailPlain(self, lang=LANG_DE):
-		dow = day_of_week_str(self.start_date.weekday(), lang)
-		dow2 = day_of_week_str(self.end_date.weekday(), lang)
+		start = self.start_date
+		end = self.end_date
+		dow = day_of_week_str(start.weekday(), lang)
+		dow2 = day_of_week_str(end.weekday(), lang)
 		to = to_in_lang(lang)
-		return "%s, %02d.%02d. %02d:%02d %s %s, %02d.%02d. %02d:%02d: %s" % (dow, self.start_date.day, self.start_date.month, self.start_date.hour, self.start_date.minute, to, dow2, self.end_date.day, self.end_date.month, self.end_date.hour, self.end_date.minute, self.getPlainName())
+		return "%s, %02d.%02d. %02d:%02d %s %s, %02d.%02d. %02d:%02d: %s" % (dow, start.day, start.month, start.hour, start.minute, to, dow2, end.day, end.month, end.hour, end.minute, self.getPlainName())
 
 	def getMediawikiEntry(self, lang=LANG_DE):
-		dow = day_of_week_str(self.start_date.weekday(), lang)
-		dow2 = day_of_week_str(self.end_date.weekday(), lang)
+		start = self.start_date
+		end = self.end_date
+		dow = day_of_week_str(start.weekday(), lang)
+		dow2 = day_of_week_str(end.weekday(), lang)
 		to = to_in_lang(lang)
-		return "* %s, %02d.%02d. %02d:%02d %s %s, %02d.%02d. %02d:%02d: %s" % (dow, self.start_date.day, self.start_date.month, self.start_date.hour, self.start_date.minute, to, dow2, self.end_date.day, self.end_date.month, self.end_date.hour, self.end_date.minute, self.getMediawikiName())
+		return "* %s, %02d.%02d. %02d:%02d %s %s, %02d.%02d. %02d:%02d: %s" % (dow, start.day, start.month, start.hour, start.minute, to, dow2, end.day, end.month, end.hour, end.minute, self.getMediawikiName())
 
 	def getDateString(self):
-		return "%02d.%02d.%02d %02d:%02d - %02d.%02d.%02d %02d:%02d" % (self.start_date.day, self.start_date.month, self.start_date.year, self.start_date.hour, self.start_date.minute, self.end_date.day, self.end_date.month, self.end_date.year, self.end_date.hour, self.end_date.minute)
+		start = self.start_date
+		end = self.end_date
+		return "%02d.%02d.%02d %02d:%02d - %02d.%02d.%02d %02d:%02d" % (start.day, start.month, start.year, start.hour, start.minute, end.day, end.month, end.year, end.hour, end.minute)
+
+
+class DateTimeRange(DateTimeRangeFormat, DateRecord):
+	__slots__ = ()
+
+	def __init__(self, name, category, values):
+		day, month, year, hour, minute, day2, month2, year2, hour2, minute2 = map(int, values)
+		date = tz.localize(datetime.datetime(year, month, day, hour, minute))
+		date_end = tz.localize(datetime.datetime(year2, month2, day2, hour2, minute2))
+		DateRecord.__init__(self, name, category, date, date_end)
 
 
 class Generator:
 	def __init__(self):
-		self.entries = []
+		self.rule = None
+		self._entries = None
+		self._first = None
+		self._last = None
+		self._sort_key = None
+
+	@property
+	def entries(self):
+		if self._entries is None:
+			self._entries = list(self.iter_entries())
+		return self._entries
+
+	def iter_entries(self):
+		return iter(())
+
+	def entries_between(self, start, end):
+		# occurrences overlapping [start, end), built on demand
+		return [e for e in self.entries if e.end_datetime() > start and e.start_datetime() < end]
+
+	def first_entry(self):
+		if self._first is None:
+			self._first = next(self.iter_entries(), None)
+		return self._first
+
+	def last_entry(self):
+		if self.entries:
+			return self.entries[-1]
+		return None
+
+	def fingerprint(self):
+		return "\n".join(entry.fingerprint() for entry in self.entries)
 
 	def getIcal(self):
-		if not self.entries:
+		first = self.first_entry()
+		if not first:
 			return None
-		first = self.entries[0]
 		event = first.getIcal()
-		interval = first.rule._interval
-		until = first.rule._until
+		interval = self.rule._interval
+		until = self.rule._until
 		event.add('rrule', {'FREQ': ['WEEKLY'], 'INTERVAL': [interval], 'UNTIL': [until]})
 		return event
 
+	def getIcalLines(self):
+		first = self.first_entry()
+		if not first:
+			return None
+		lines = first.getIcalLines()
+		# icalendar puts RRULE right after UID
+		lines.insert(4, "RRULE:FREQ=WEEKLY;UNTIL=%s;INTERVAL=%d" % (self.rule._until.strftime("%Y%m%dT%H%M%S"), self.rule._interval))
+		return lines
+
 	def getMediawikiRow(self):
-		first = self.entries[0]
+		first = self.first_entry()
 		return ("| %s || %s || %s" % (first.getMediawikiName(), self.getDateString(), self.getDateRangeString())).strip()
 
 	def getDateString(self):
-		first = self.entries[0]
-		interval = first.rule._interval
+		first = self.first_entry()
+		interval = self.rule._interval
 		if interval > 1:
 			interval = "/%d" % interval
 		else:
@@ -382,27 +592,32 @@ class Generator:
 		return "%s%s, %s" % (dow_list[first.start_date.weekday()], interval, first.getDateString())
 
 	def getDateRangeString(self):
-		first = self.entries[0]
-		start = first.start_date
-		end = first.rule._until
+		start = self.first_entry().start_date
+		end = self.rule._until
 		return "%02d.%02d.%04d - %02d.%02d.%04d" % (start.day, start.month, start.year, end.day, end.month, end.year)
 
+	def sort_key(self):
+		if self._sort_key is None:
+			self._sort_key = self.last_entry().sort_key()
+		return self._sort_key
+
 	def __lt__(self, other):
-		return self.entries[-1] < other
+		return self.last_entry() < other
 
 	def start_datetime(self):
-		return self.entries[0].start_datetime()
+		return self.first_entry().start_datetime()
 
 	def end_datetime(self):
-		return self.entries[-1].end_datetime()
+		return self.last_entry().end_datetime()
 
 
 class WeekdayTimeRangeGenerator(Generator):
 	def __init__(self, name, category, values, rep):
 		Generator.__init__(self)
+		self.name = name
 		self.category = category
-		nonetime = False
-		self.entries = []
+		self.nonetime = False
+		self.delta = None
 		rep = date_range.match(rep)
 		if not rep:
 			return
@@ -415,7 +630,7 @@ class WeekdayTimeRangeGenerator(Generator):
 			hour2 = int(hour2)
 		else:
 			hour2 = (hour + DEFAULT_DURATION) % 24
-			nonetime = True
+			self.nonetime = True
 		if minute2:
 			minute2 = int(minute2)
 		else:
@@ -436,43 +651,308 @@ class WeekdayTimeRangeGenerator(Generator):
 		start2 = tz.localize(datetime.datetime(year, month, day, hour2, minute2))
 		if start2 < start:
 			start2 += datetime.timedelta(days=1)
-		delta = start2 - start
+		self.delta = start2 - start
 		stop = tz.localize(datetime.datetime(year2, month2, day2, 23, 59))
-		rule = rrule.rrule(rrule.WEEKLY, interval=interval, byweekday=wd, dtstart=start, until=stop)
-		for event in rule:
-			event_end = event + delta
-			if nonetime:
-				self.entries.append(RepSingleDateTime(name, category, (event.day, event.month, event.year, event.hour, event.minute), rule))
-			else:
-				if event_end.day != event.day:
-					self.entries.append(RepDateTimeRange(name, category, (event.day, event.month, event.year, event.hour, event.minute, event_end.day, event_end.month, event_end.year, event_end.hour, event_end.minute), rule))
+		self.rule = rrule.rrule(rrule.WEEKLY, interval=interval, byweekday=wd, dtstart=start, until=stop)
+		self.series = Series(name, category, self.rule, self.delta, self.nonetime)
+
+	def iter_entries(self):
+		if self.rule is None:
+			return iter(())
+		return (self.series.entry(start) for start in self.series.starts)
+
+	def fingerprint(self):
+		return "%s|%s|%s|%s|%s|%s" % (self.__class__.__name__, self.name, self.category, self.rule, self.delta, self.nonetime)
+
+	def entries_between(self, start, end):
+		if self.rule is None:
+			return []
+		if self._entries is not None:
+			return Generator.entries_between(self, start, end)
+		# only the entries overlapping the window are created
+		after, before = start.timestamp(), end.timestamp()
+		starts, ends = self.series.starts, self.series.ends
+		return [self.series.entry(first) for first, last in zip(starts, ends) if last > after and first < before]
+
+	def last_entry(self):
+		if self.rule is None:
+			return None
+		if self._entries is not None:
+			return Generator.last_entry(self)
+		if self._last is None:
+			event = self.last_occurrence()
+			if event is not None:
+				self._last = self.make_entry(event)
+		return self._last
+
+	def last_occurrence(self):
+		# same as rule.before(until, inc=True) without iterating the rule:
+		# occurrences are whole weeks apart and keep the tzinfo of the first
+		first = next(iter(self.rule), None)
+		if first is None:
+			return None
+		until = self.rule._until
+		step = datetime.timedelta(weeks=self.rule._interval)
+		event = first + (until.date() - first.date()) // step * step
+		# the utc offset of the first occurrence may move the last one
+		# across midnight of the end date
+		if event + step <= until:
+			event += step
+		elif event > until:
+			event -= step
+		return event
 
-				else:
-					self.entries.append(RepSingleDateTimeRange(name, category, (event.day, event.month, event.year, event.hour, event.minute, event_end.hour, event_end.minute), rule))
+	def make_entry(self, event):
+		return self.series.occurrence(event)
 
 
-class RepSingleDateTime(SingleDateTime):
-	def __init__(self, name, category, values, rule):
-		SingleDateTime.__init__(self, name, category, values)
+class Series(object):
+	# what all occurrences of a weekly series have in common. occurrences
+	# only keep their start in epoch seconds, their dates are created when
+	# needed; the few that can not be recreated from the epoch seconds (dst
+	# changes) are kept in `exceptions`
+	__slots__ = ("name", "category", "rule", "delta", "length", "nonetime", "first", "first_timestamp", "cls", "exceptions", "starts", "ends")
+
+	def __init__(self, name, category, rule, delta, nonetime):
+		self.name = sys.intern(name)
+		self.category = intern_text(category)
 		self.rule = rule
+		self.delta = delta
+		self.length = int(delta.total_seconds())
+		self.nonetime = nonetime
+		self.first = rule._dtstart.replace(tzinfo=None)
+		self.first_timestamp = rule._dtstart.timestamp()
+		# all occurrences have the same wall times
+		if nonetime:
+			self.cls = RepSingleDateTime
+		elif (self.first + delta).day != self.first.day:
+			self.cls = RepDateTimeRange
+		else:
+			self.cls = RepSingleDateTimeRange
+		self.exceptions = {}
+		# starts and ends of all occurrences in epoch seconds, computed once.
+		# they are small and are kept with the series in the parse cache. a
+		# time that does not exist on a dst change is rejected here like any
+		# other invalid date
+		self.starts = self.timestamps()
+		self.ends = self.end_timestamps(self.starts)
+
+	def fingerprint(self):
+		return "%s|%s|%s|%s|%s" % (self.cls.__name__, self.name, self.category, self.rule, self.delta)
+
+	def occurrence(self, event):
+		return self.entry(self.timestamp(event))
+
+	def timestamp(self, event):
+		# start of the occurrence at event in epoch seconds, the same as the
+		# start_date of SingleDateTime(...) etc. with the wall time of event
+		naive = datetime.datetime(event.year, event.month, event.day, event.hour, event.minute)
+		start = None
+		if self.length > 0:
+			start = local_timestamp(naive, self.first_timestamp + (naive - self.first).total_seconds())
+			if start is not None and not self.nonetime and local_timestamp(naive + self.delta, start + self.length) != start + self.length:
+				start = None
+		if start is None:
+			start = self.localize(naive, self.cls)
+		return start
+
+	def timestamps(self):
+		# starts of all occurrences in epoch seconds, the same as
+		# [self.timestamp(event) for event in self.rule]. the events of the
+		# rule are whole weeks apart in the utc offset of the first, so the
+		# starts between two dst changes are a range; only occurrences
+		# touching a dst change are resolved one by one
+		starts = array.array("q")
+		first = next(iter(self.rule), None)
+		if first is None:
+			return starts
+		step = self.rule._interval * 7 * 24 * 60 * 60
+		count = int((self.rule._until - first).total_seconds()) // step + 1
+		if self.length <= 0:
+			starts.extend(self.timestamp(event) for event in self.rule)
+			return starts
+		# wall time of the first occurrence, in seconds since the epoch
+		wall = int(first.timestamp()) + int(first.utcoffset().total_seconds())
+		# the end of an occurrence has to be in the same stretch
+		span = 0 if self.nonetime else self.length
+		segments = local_time_segments()
+		k = 0
+		for lo, hi, offset in segments[bisect.bisect_right(segments, (wall - span,)) - 1:]:
+			if k >= count:
+				break
+			a = max(k, -((wall - lo) // step))
+			b = min(count, (hi - span - 1 - wall) // step + 1)
+			if a >= b:
+				continue
+			for j in range(k, a):
+				starts.append(self.timestamp(first + datetime.timedelta(seconds=j * step)))
+			starts.extend(range(wall + a * step - offset, wall + b * step - offset, step))
+			k = b
+		for j in range(k, count):
+			starts.append(self.timestamp(first + datetime.timedelta(seconds=j * step)))
+		return starts
+
+	def end_timestamps(self, starts):
+		# end_timestamp() of all starts
+		duration = DEFAULT_DURATION * 60 * 60 if self.nonetime else self.length
+		ends = array.array("q", [start + duration for start in starts])
+		for start, (_, end) in self.exceptions.items():
+			i = bisect.bisect_left(starts, start)
+			if i < len(starts) and starts[i] == start:
+				ends[i] = int(end.timestamp())
+		return ends
+
+	def end_timestamp(self, start):
+		# end of the occurrence starting at start in epoch seconds
+		exception = self.exceptions.get(start)
+		if exception:
+			return int(exception[1].timestamp())
+		if self.nonetime:
+			return start + DEFAULT_DURATION * 60 * 60
+		return start + self.length
+
+	def entry(self, start):
+		entry = self.cls.__new__(self.cls)
+		entry.series = self
+		entry.start = start
+		entry._sort_key = None
+		entry._plain_name = None
+		entry._url = None
+		return entry
+
+	def localize(self, naive, cls):
+		# the slow way with pytz for occurrences in or across a dst change
+		start = tz.localize(naive)
+		if self.nonetime:
+			end = start + datetime.timedelta(hours=DEFAULT_DURATION)
+		else:
+			end = tz.localize(naive + self.delta)
+			if cls is RepSingleDateTimeRange and end < start:
+				end += datetime.timedelta(days=1)
+		if end <= start:
+			raise InvalidDateEntryException
+		timestamp = int(start.timestamp())
+		if not same_datetime(datetime.datetime.fromtimestamp(timestamp, tz), start) or self.nonetime or not same_datetime(datetime.datetime.fromtimestamp(timestamp + self.length, tz), end):
+			self.exceptions[timestamp] = (start, end)
+		return timestamp
+
+
+def local_timestamp(naive, guess):
+	# epoch seconds of the local time naive like tz.localize(naive), which is
+	# slow, starting at guess. None if naive does not exist (dst gap).
+	for _ in range(2):
+		local = datetime.datetime.fromtimestamp(guess, tz)
+		diff = (local.replace(tzinfo=None) - naive).total_seconds()
+		if not diff:
+			break
+		guess -= diff
+	else:
+		return None
+	dst = local.dst()
+	if dst:
+		# localize prefers standard time for ambiguous times
+		later = guess + dst.total_seconds()
+		if datetime.datetime.fromtimestamp(later, tz).replace(tzinfo=None) == naive:
+			guess = later
+	return int(guess)
+
+
+@functools.lru_cache(maxsize=1)
+def local_time_segments():
+	# (from, to, utc offset) in seconds of the stretches of local wall time
+	# between two dst changes in which every time exists exactly once, wall
+	# times in seconds since the epoch as if they were utc
+	epoch = datetime.datetime(1970, 1, 1)
+	changes = [int((change - epoch).total_seconds()) for change in tz._utc_transition_times]
+	offsets = [int(info[0].total_seconds()) for info in tz._transition_info]
+	segments = []
+	for i, (change, offset) in enumerate(zip(changes, offsets)):
+		lo = float("-inf") if i == 0 else change + max(offsets[i - 1], offset)
+		hi = float("inf") if i + 1 == len(changes) else changes[i + 1] + min(offset, offsets[i + 1])
+		segments.append((lo, hi, offset))
+	return segments
+
+
+def same_datetime(a, b):
+	# equal and in the same utc offset
+	return a == b and a.tzinfo is b.tzinfo
+
+
+class Occurrence(DatePrinter):
+	# the DatePrinter part of an occurrence of a Series, only the start and
+	# the caches of DatePrinter are stored per occurrence
+	__slots__ = ("series", "start", "_sort_key", "_plain_name", "_url")
+
+	@property
+	def name(self):
+		return self.series.name
+
+	@property
+	def category(self):
+		return self.series.category
+
+	@property
+	def rule(self):
+		return self.series.rule
+
+	@property
+	def start_date(self):
+		exception = self.series.exceptions.get(self.start)
+		if exception:
+			return exception[0]
+		return self.default_start_date()
+
+	@property
+	def end_date(self):
+		exception = self.series.exceptions.get(self.start)
+		if exception:
+			return exception[1]
+		return self.default_end_date()
+
+	def default_start_date(self):
+		return datetime.datetime.fromtimestamp(self.start, tz)
+
+	def default_end_date(self):
+		if self.series.nonetime:
+			return self.start_date + datetime.timedelta(hours=DEFAULT_DURATION)
+		return datetime.datetime.fromtimestamp(self.start + self.series.length, tz)
+
+	def sort_key(self):
+		# without creating the dates
+		if self._sort_key is None:
+			self._sort_key = (float(self.series.end_timestamp(self.start)), float(self.start), self.name)
+		return self._sort_key
+
+	def __reduce__(self):
+		return (self.series.entry, (self.start,))
+
+
+class RepSingleDateTime(Occurrence, SingleDateTimeFormat):
+	__slots__ = ()
 
 	def getDateString(self):
-		return "%02d:%02d" % (self.start_date.hour, self.start_date.minute)
+		start = self.start_date
+		return "%02d:%02d" % (start.hour, start.minute)
 
 
-class RepSingleDateTimeRange(SingleDateTimeRange):
-	def __init__(self, name, category, values, rule):
-		SingleDateTimeRange.__init__(self, name, category, values)
-		self.rule = rule
+class RepSingleDateTimeRange(Occurrence, SingleDateTimeRangeFormat):
+	__slots__ = ()
 
 	def getDateString(self):
-		return "%02d:%02d - %02d:%02d" % (self.start_date.hour, self.start_date.minute, self.end_date.hour, self.end_date.minute)
+		start = self.start_date
+		end = self.end_date
+		return "%02d:%02d - %02d:%02d" % (start.hour, start.minute, end.hour, end.minute)
 
 
-class RepDateTimeRange(DateTimeRange):
-	def __init__(self, name, category, values, rule):
-		DateTimeRange.__init__(self, name, category, values)
-		self.rule = rule
+class RepDateTimeRange(Occurrence, DateTimeRangeFormat):
+	__slots__ = ()
+
+
+# occurrences format like and are instances of the classes of the single
+# entries, without their slots
+SingleDateTime.register(RepSingleDateTime)
+SingleDateTimeRange.register(RepSingleDateTimeRange)
+DateTimeRange.register(RepDateTimeRange)
 
 
 class WeekdayTimeGenerator(WeekdayTimeRangeGenerator):
@@ -490,62 +970,168 @@ tests = [(single_date, SingleDate),
 		(weekday_time_range, WeekdayTimeRangeGenerator)]
 
 
-def analyze_date(name, category, date, rep):
-	for regex, dateClass in tests:
-		try:
-			rg = regex.match(date)
-			if rg:
-				if issubclass(dateClass, Generator):
-					return dateClass(name, category, rg.groups(), rep)
-				else:
-					return dateClass(name, category, rg.groups())
-		except InvalidDateEntryException:
-			sys.stderr.write("InvalidDate: %s %s %s %s\n" % (name, category, date, rep))
-			sys.stderr.flush()
-			return
+# all date patterns above, factored into one regex so that a date cell is
+# classified in a single scan. group layout:
+#   1-3 date, 4-5 time, 6-7 end time, 8-12 end date and time,
+#   13-15 end date, 16 weekday, 17-18 time, 19-20 end time
+_date = r"(\d+)\.(\d+)\.(\d+)"
+_time = r"(\d+)[:\.](\d+)"
+_to = r"\s*\-\s*"
+date_matcher = re.compile(
+	r"^(?:" + _date + r"(?:\s+" + _time + r"(?:" + _to + r"(?:" + _time + r"|" + _date + r"\s+" + _time + r"))?" +
+	r"|" + _to + _date + r")?" +
+	r"|([a-zA-Z0-9/]+),?\s*" + _time + r"(?:" + _to + _time + r")?)$")
+
+# last matched group -> (class, groups to pass on), same classes as `tests`
+date_dispatch = {
+	3: (SingleDate, (1, 2, 3)),
+	5: (SingleDateTime, (1, 2, 3, 4, 5)),
+	7: (SingleDateTimeRange, (1, 2, 3, 4, 5, 6, 7)),
+	12: (DateTimeRange, (1, 2, 3, 4, 5, 8, 9, 10, 11, 12)),
+	15: (DateRange, (1, 2, 3, 13, 14, 15)),
+	18: (WeekdayTimeGenerator, (16, 17, 18)),
+	20: (WeekdayTimeRangeGenerator, (16, 17, 18, 19, 20))}
+
+
+def match_date(date):
+	rg = date_matcher.match(date)
+	if not rg:
+		return None, None
+	dateClass, groups = date_dispatch[rg.lastindex]
+	return dateClass, rg.group(*groups)
 
 
-def tokenize_wiki_page(content):
-	result = []
+def analyze_date(name, category, date, rep):
+	dateClass, values = match_date(date)
+	if not dateClass:
+		return
+	try:
+		if issubclass(dateClass, Generator):
+			return dateClass(name, category, values, rep)
+		else:
+			return dateClass(name, category, values)
+	except InvalidDateEntryException:
+		sys.stderr.write("InvalidDate: %s %s %s %s\n" % (name, category, date, rep))
+		sys.stderr.flush()
+		return
+
+
+def iter_lines(content):
+	# same lines as content.splitlines() for a string, without splitting the
+	# whole string at once; any other iterable (e.g. a file) is read line by
+	# line
+	if isinstance(content, str):
+		for line in iter_string_lines(content):
+			yield line
+		return
+	for line in content:
+		parts = line.splitlines(False)
+		if not parts:
+			yield line
+		for part in parts:
+			yield part
+
+
+def iter_string_lines(content, chunk_size=LINE_CHUNK_SIZE):
+	rest = u""
+	for start in range(0, len(content), chunk_size):
+		lines = (rest + content[start:start + chunk_size]).splitlines(True)
+		# the last line may continue in the next chunk (this includes a
+		# "\r" that is followed by "\n")
+		rest = lines.pop()
+		for line in lines:
+			yield line.splitlines(False)[0]
+	if rest:
+		yield rest.splitlines(False)[0]
+
+
+def iter_wiki_page(content):
 	category = None
-	for line in content.splitlines(False):
+	for line in iter_lines(content):
 		line = line.strip()
 		dateinfo = entry.match(line)
 		if not dateinfo:
 			new_cat = category_re.match(line)
 			if new_cat:
 				category = new_cat.group(1).strip()
-				result.append((T_CATEGORY, category))
+				yield T_CATEGORY, category
 				continue
 			divider = divider_re.match(line)
 			if divider:
-				result.append((T_ROW_DIVIDER, None))
+				yield T_ROW_DIVIDER, None
 				continue
-			result.append((T_REST, line))
+			yield T_REST, line
 			continue
 		name, date, rep = dateinfo.groups()
 		obj = analyze_date(name, category, date, rep)
 		if obj:
-			result.append((T_EVENT, obj))
+			yield T_EVENT, obj
 		else:
-			result.append((T_INVALID_EVENT, line))
-	return result
-
-
-def parse_wiki_page(content):
+			yield T_INVALID_EVENT, line
+
+
+def tokenize_wiki_page(content, workers=None):
+	# with workers > 1 large pages are tokenized in a process pool
+	if workers and workers > 1:
+		return tokenize_wiki_page_parallel(content, workers)
+	return list(iter_wiki_page(content))
+
+
+def split_wiki_page(lines, parts):
+	# lines split into about `parts` chunks of at least PARALLEL_CHUNK_LINES
+	# lines, each chunk but the first starts with a category. the category
+	# of an event only depends on the lines since the last category, so the
+	# chunks can be tokenized independently
+	size = max(PARALLEL_CHUNK_LINES, len(lines) // parts)
+	chunks = []
+	start = 0
+	for i in range(size, len(lines)):
+		if i - start >= size and category_re.match(lines[i].strip()):
+			chunks.append(lines[start:i])
+			start = i
+	chunks.append(lines[start:])
+	return chunks
+
+
+def tokenize_lines(lines):
+	return list(iter_wiki_page(lines))
+
+
+def tokenize_wiki_page_parallel(content, workers):
+	# same tokens as tokenize_wiki_page(content), the chunks of
+	# split_wiki_page are tokenized by `workers` processes and the results
+	# are joined in page order. there are more chunks than workers, so a
+	# slow chunk does not keep the other workers waiting
+	chunks = split_wiki_page(list(iter_lines(content)), workers * 4)
+	if len(chunks) == 1:
+		return tokenize_lines(chunks[0])
+	# forkserver, as forking the bot with its http threads running is not
+	# safe; the workers start from a clean process that imports this module
+	tokens = []
+	with multiprocessing.get_context("forkserver").Pool(min(workers, len(chunks))) as pool:
+		for result in pool.imap(tokenize_lines, chunks):
+			tokens.extend(result)
+	return tokens
+
+
+def parse_wiki_page(content, workers=None):
 	result = []
-	category = None
-	for token, value in tokenize_wiki_page(content):
+	tokens = tokenize_wiki_page(content, workers) if workers else iter_wiki_page(content)
+	for token, value in tokens:
 		if token == T_EVENT:
 			result.append(value)
 	return result
 
 
 def parse_wiki_page_ordered(pagedata):
+	return order_tokens(iter_wiki_page(pagedata))
+
+
+def order_tokens(tokens):
 	ordered_categories = []
 	category = None
 	events = {}
-	for token, value in tokenize_wiki_page(pagedata):
+	for token, value in tokens:
 		if token == T_CATEGORY:
 			category = value
 			if category not in ordered_categories:
@@ -556,21 +1142,109 @@ def parse_wiki_page_ordered(pagedata):
 	return ordered_categories, events
 
 
-def move_to_archive(events_text, archive_text, threshold_date):
+class ParseCache(object):
+	# tokenized and expanded pages, stored on disk by a hash of the page
+	# text. entries written by another parser version are ignored, the
+	# least recently used entries are removed above max_entries/max_bytes
+	def __init__(self, directory, max_entries=PARSE_CACHE_ENTRIES, max_bytes=PARSE_CACHE_BYTES):
+		self.directory = directory
+		self.max_entries = max_entries
+		self.max_bytes = max_bytes
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+
+	def key(self, content):
+		h = hashlib.sha256(parser_version().encode("utf8"))
+		h.update(content.encode("utf8"))
+		return h.hexdigest()
+
+	def path(self, key):
+		return os.path.join(self.directory, "%s.parsed" % key)
+
+	def load(self, key):
+		path = self.path(key)
+		try:
+			with open(path, "rb") as f:
+				version, tokens = pickle.loads(zlib.decompress(f.read()))
+		except (OSError, EOFError, ValueError, zlib.error, pickle.UnpicklingError, AttributeError, ImportError):
+			return None
+		if version != parser_version():
+			return None
+		os.utime(path, None)
+		return tokens
+
+	def store(self, key, tokens):
+		data = zlib.compress(pickle.dumps((parser_version(), tokens), pickle.HIGHEST_PROTOCOL), 1)
+		fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+		with os.fdopen(fd, "wb") as f:
+			f.write(data)
+		os.replace(tmp, self.path(key))
+		self.evict()
+
+	def evict(self):
+		# another process sharing the directory may remove entries meanwhile
+		files = []
+		for name in os.listdir(self.directory):
+			if name.endswith(".parsed"):
+				try:
+					stat = os.stat(os.path.join(self.directory, name))
+				except FileNotFoundError:
+					continue
+				files.append((stat.st_mtime, stat.st_size, name))
+		files.sort(reverse=True)
+		total = 0
+		for i, (_, size, name) in enumerate(files):
+			total += size
+			if i >= self.max_entries or (i > 0 and total > self.max_bytes):
+				try:
+					os.remove(os.path.join(self.directory, name))
+				except FileNotFoundError:
+					pass
+
+	def tokenize(self, content, workers=None):
+		key = self.key(content)
+		tokens = self.load(key)
+		if tokens is None:
+			tokens = tokenize_wiki_page(content, workers)
+			self.store(key, tokens)
+		return tokens
+
+	def parse(self, content, workers=None):
+		return [value for token, value in self.tokenize(content, workers) if token == T_EVENT]
+
+
+@functools.lru_cache(maxsize=1)
+def parser_version():
+	# changes with PARSE_CACHE_VERSION and with the source of this module
+	with open(os.path.abspath(__file__), "rb") as f:
+		source = hashlib.sha256(f.read()).hexdigest()
+	return "%d-%s" % (PARSE_CACHE_VERSION, source)
+
+
+def move_to_archive(events_text, archive_text, threshold_date, cache=None, workers=None):
 	n = 0
-	events_categories, _ = parse_wiki_page_ordered(events_text)
-	archive_categories, archive_events = parse_wiki_page_ordered(archive_text)
+	# both pages are tokenized exactly once
+	if cache:
+		tokens = cache.tokenize(events_text, workers)
+		archive_categories, archive_events = order_tokens(cache.tokenize(archive_text, workers))
+	else:
+		tokens = tokenize_wiki_page(events_text, workers)
+		archive_categories, archive_events = order_tokens(tokenize_wiki_page(archive_text, workers))
+	events_categories, _ = order_tokens(tokens)
 
 	archive_final_categories = list(events_categories)
 	for category in archive_categories:
 		if category not in archive_final_categories:
 			archive_final_categories.append(category)
 
+	index = EventIndex(value for token, value in tokens if token == T_EVENT)
+	archived = set(id(value) for value in index.starting_before(threshold_date))
+
 	flatend = []
 	skip_divider = False
-	for token, value in tokenize_wiki_page(events_text):
+	for token, value in tokens:
 		if token == T_EVENT:
-			if value < threshold_date:
+			if id(value) in archived:
 				if value.category not in archive_events:
 					archive_events[value.category] = []
 				archive_events[value.category].append(value)
@@ -590,7 +1264,7 @@ def move_to_archive(events_text, archive_text, threshold_date):
 			archive_flatend.append((T_CATEGORY, category))
 			archive_flatend.append((T_REST, u"{| class=\"prettytable\""))
 			archive_flatend.append((T_REST, u"! Event !! Termin !! Im Zeitraum"))
-			for event in sorted(archive_events[category]):
+			for event in sorted(archive_events[category], key=entry_sort_key):
 				archive_flatend.append((T_ROW_DIVIDER, None))
 				archive_flatend.append((T_EVENT, event))
 
@@ -602,80 +1276,377 @@ def move_to_archive(events_text, archive_text, threshold_date):
 	return new_events, new_archive, n
 
 
-def render_page(flatend):
-	r = u""
+def render_lines(flatend):
 	for token, value in flatend:
 		if token == T_REST:
-			r += u"%s\n" % value
+			yield u"%s\n" % value
 		elif token == T_CATEGORY:
-			r += u"== %s ==\n" % value
+			yield u"== %s ==\n" % value
 		elif token == T_ROW_DIVIDER:
-			r += u"|-\n"
+			yield u"|-\n"
 		elif token == T_EVENT:
-			r += u"%s\n" % value.getMediawikiRow()
+			yield u"%s\n" % value.getMediawikiRow()
 		elif token == T_INVALID_EVENT:
-			r += u"%s\n" % value
+			yield u"%s\n" % value
 			print(str(token), repr(value))
 		else:
 			print(str(token), repr(value))
-	return r.strip()
 
 
-def expand_dates(dates):
+def write_page(flatend, out):
+	# writes the page to the file-like `out`, stripped like render_page:
+	# leading whitespace is dropped and trailing whitespace is held back
+	# until more text follows
+	pending = u""
+	started = False
+	for line in render_lines(flatend):
+		if not started:
+			line = line.lstrip()
+			if not line:
+				continue
+			started = True
+		text = line.rstrip()
+		if text:
+			out.write(pending)
+			out.write(text)
+			pending = line[len(text):]
+		else:
+			pending += line
+
+
+def render_page(flatend):
+	out = io.StringIO()
+	write_page(flatend, out)
+	return out.getvalue()
+
+
+def expand_dates(dates, start=None, end=None):
+	# with start and end only entries overlapping [start, end) are returned
+	# and recurring events are expanded inside that window only
+	windowed = start is not None and end is not None
 	result = []
 	for date in dates:
 		if issubclass(date.__class__, Generator):
-			result.extend(date.entries)
-		else:
+			if windowed:
+				result.extend(date.entries_between(start, end))
+			else:
+				result.extend(date.entries)
+		elif not windowed or (date.end_datetime() > start and date.start_datetime() < end):
 			result.append(date)
 	return result
 
 
+class OccurrenceStore(object):
+	# the rows of expand_dates() as parallel arrays instead of one object per
+	# occurrence: start and end in epoch milliseconds (end exclusive), ids
+	# into the name and category tables and the single entry or Series each
+	# row belongs to. the rows of a source are consecutive and start at
+	# offsets[source]. weekly series are added without creating occurrences,
+	# entry(i) creates the DatePrinter of a row when it is needed
+	def __init__(self, dates=(), start=None, end=None):
+		self.starts = array.array("q")
+		self.ends = array.array("q")
+		self.names = array.array("i")
+		self.categories = array.array("i")
+		self.sources = array.array("i")
+		self.offsets = array.array("q")
+		self.name_table = []
+		self.category_table = []
+		self.source_table = []
+		self.name_ids = {}
+		self.category_ids = {}
+		self.name_json = {}
+		self.extend(dates, start, end)
+
+	def __len__(self):
+		return len(self.starts)
+
+	def __iter__(self):
+		return (self.entry(i) for i in range(len(self)))
+
+	def name_id(self, name):
+		if name not in self.name_ids:
+			self.name_ids[name] = len(self.name_table)
+			self.name_table.append(name)
+		return self.name_ids[name]
+
+	def category_id(self, category):
+		if category not in self.category_ids:
+			self.category_ids[category] = len(self.category_table)
+			self.category_table.append(category)
+		return self.category_ids[category]
+
+	def append(self, start, end, name, category, source):
+		self.starts.append(start)
+		self.ends.append(end)
+		self.names.append(name)
+		self.categories.append(category)
+		self.sources.append(source)
+
+	def extend(self, dates, start=None, end=None):
+		# adds the rows of expand_dates(dates, start, end)
+		after = before = None
+		if start is not None and end is not None:
+			after, before = int(start.timestamp() * 1000), int(end.timestamp() * 1000)
+		for date in dates:
+			if isinstance(date, WeekdayTimeRangeGenerator):
+				if date.rule is not None:
+					self.add_series(date.series, after, before)
+			elif issubclass(date.__class__, Generator):
+				for entry in date.entries:
+					self.add_entry(entry, after, before)
+			else:
+				self.add_entry(date, after, before)
+
+	def add_entry(self, entry, after=None, before=None):
+		start = int(entry.start_datetime().timestamp() * 1000)
+		end = int(entry.end_datetime().timestamp() * 1000)
+		if after is not None and (end <= after or start >= before):
+			return
+		self.offsets.append(len(self))
+		self.append(start, end, self.name_id(entry.name), self.category_id(entry.category), len(self.source_table))
+		self.source_table.append(entry)
+
+	def add_series(self, series, after=None, before=None):
+		source = len(self.source_table)
+		self.offsets.append(len(self))
+		self.source_table.append(series)
+		name, category = self.name_id(series.name), self.category_id(series.category)
+		starts, ends = series.starts, series.ends
+		if after is not None:
+			rows = [i for i in range(len(starts)) if ends[i] * 1000 > after and starts[i] * 1000 < before]
+			starts = array.array("q", [starts[i] for i in rows])
+			ends = array.array("q", [ends[i] for i in rows])
+		self.starts.extend([start * 1000 for start in starts])
+		self.ends.extend([end * 1000 for end in ends])
+		self.names.extend(array.array("i", [name]) * len(starts))
+		self.categories.extend(array.array("i", [category]) * len(starts))
+		self.sources.extend(array.array("i", [source]) * len(starts))
+
+	def entry(self, i):
+		source = self.source_table[self.sources[i]]
+		if isinstance(source, Series):
+			return source.entry(self.starts[i] // 1000)
+		return source
+
+	def sorted_rows(self):
+		# (rows by start, rows in the order of sorted(entries,
+		# key=entry_sort_key)), i.e. by end, start and name. stable sorts by
+		# name, start and end; sorting by name only has to order the sources
+		# as all rows of a source have its name
+		sources = sorted(range(len(self.source_table)), key=lambda source: self.source_table[source].name)
+		bounds = self.offsets.tolist() + [len(self)]
+		rows = list(itertools.chain.from_iterable(range(bounds[source], bounds[source + 1]) for source in sources))
+		rows.sort(key=self.starts.__getitem__)
+		by_start = rows[:]
+		rows.sort(key=self.ends.__getitem__)
+		return by_start, rows
+
+	def fingerprint(self):
+		h = hashlib.sha256()
+		for source in self.source_table:
+			h.update(source.fingerprint().encode("utf8"))
+			h.update(b"\n")
+		for column in (self.starts, self.ends, self.sources):
+			h.update(column.tobytes())
+		return h.hexdigest()
+
+	def json_items(self):
+		# getJson() of every row, the parts that only depend on the name are
+		# computed once per name
+		classes = ["event-%s" % simple_name(category) for category in self.category_table]
+		for i in range(len(self)):
+			entry = self.entry(i)
+			name = self.names[i]
+			if name not in self.name_json:
+				self.name_json[name] = (hashlib.md5(entry.getPlainName().encode("utf8")).hexdigest(), entry.getURL())
+			eventid, url = self.name_json[name]
+			yield {"id": eventid, "title": entry.getDetailPlain(), "url": url, "class": classes[self.categories[i]], "start": self.starts[i], "end": self.ends[i] - 1}
+
+
+class StoreEntries(object):
+	# the entries of rows of an OccurrenceStore as a read-only sequence
+	def __init__(self, store, rows):
+		self.store = store
+		self.rows = rows
+
+	def __len__(self):
+		return len(self.rows)
+
+	def __getitem__(self, i):
+		if isinstance(i, slice):
+			return [self.store.entry(row) for row in self.rows[i]]
+		return self.store.entry(self.rows[i])
+
+	def __iter__(self):
+		return (self.store.entry(row) for row in self.rows)
+
+
+class StoreColumn(object):
+	# a column of an OccurrenceStore in the order of rows, bisectable without
+	# copying the column
+	def __init__(self, column, rows):
+		self.column = column
+		self.rows = rows
+
+	def __len__(self):
+		return len(self.rows)
+
+	def __getitem__(self, i):
+		return self.column[self.rows[i]]
+
+
+def wiki_section_window(now=None):
+	# time range used by next_up and in_before
+	if now is None:
+		now = datetime.datetime.utcnow().replace(tzinfo=pytz.utc).astimezone(tz)
+	return now - datetime.timedelta(days=MAX_IN_BEFORE_DAYS), now + datetime.timedelta(days=MAX_NEXT_UP_DAYS)
+
+
+def milliseconds(t):
+	# a datetime in epoch milliseconds like the arrays of EventIndex
+	return t.timestamp() * 1000
+
+
+class EventIndex(object):
+	# entries ordered by their sort key, i.e. by end time, with bisectable
+	# arrays of end and start times in epoch milliseconds
+	def __init__(self, entries):
+		if isinstance(entries, OccurrenceStore):
+			# the columns of the store are bisected in place and only the
+			# entries that are used are created
+			start_rows, rows = entries.sorted_rows()
+			self.entries = StoreEntries(entries, rows)
+			self.ends = StoreColumn(entries.ends, rows)
+			self.starts = StoreColumn(entries.starts, rows)
+			durations = map(int.__sub__, entries.ends, entries.starts)
+			self.by_start = StoreEntries(entries, start_rows)
+			self.sorted_starts = StoreColumn(entries.starts, start_rows)
+		else:
+			self.entries = sorted(entries, key=entry_sort_key)
+			self.ends = array.array("q")
+			self.starts = array.array("q")
+			for entry in self.entries:
+				end, start, _ = entry.sort_key()
+				self.ends.append(int(end * 1000))
+				self.starts.append(int(start * 1000))
+			durations = map(int.__sub__, self.ends, self.starts)
+			start_rows = sorted(range(len(self.entries)), key=self.starts.__getitem__)
+			self.by_start = [self.entries[i] for i in start_rows]
+			self.sorted_starts = array.array("q", map(self.starts.__getitem__, start_rows))
+		# in seconds
+		self.max_duration = max(durations, default=0) / 1000
+
+	def __len__(self):
+		return len(self.entries)
+
+	def __iter__(self):
+		return iter(self.entries)
+
+	def overlapping(self, start, end):
+		# entries overlapping [start, end); entries ending later than
+		# end + max_duration have to start after end
+		start, end = milliseconds(start), milliseconds(end)
+		lo = bisect.bisect_right(self.ends, start)
+		hi = bisect.bisect_left(self.ends, end + self.max_duration * 1000)
+		return [self.entries[i] for i in range(lo, hi) if self.starts[i] < end]
+
+	def ending_between(self, after, before=None, reverse=False):
+		# entries with after < end < before
+		lo = bisect.bisect_right(self.ends, milliseconds(after))
+		hi = len(self.ends)
+		if before is not None:
+			hi = bisect.bisect_left(self.ends, milliseconds(before))
+		if reverse:
+			# same as sorted(..., reverse=True), entries with equal keys
+			# keep their order
+			return sorted(self.entries[lo:hi], key=entry_sort_key, reverse=True)
+		return self.entries[lo:hi]
+
+	def next_after(self, t, n):
+		lo = bisect.bisect_right(self.ends, milliseconds(t))
+		return self.entries[lo:lo + n]
+
+	def last_before(self, t, n):
+		hi = bisect.bisect_left(self.ends, milliseconds(t))
+		return self.entries[max(0, hi - n):hi][::-1]
+
+	def starting_before(self, t):
+		hi = bisect.bisect_left(self.sorted_starts, milliseconds(t))
+		return list(self.by_start[:hi])
+
+	def next_change(self, now):
+		# earliest time after now at which an end or start crosses one of
+		# the thresholds of next_up, in_before or wiki_section_window, i.e.
+		# the wiki sections will not change before
+		t = milliseconds(now)
+		hour, day = 60 * 60 * 1000, 24 * 60 * 60 * 1000
+		end_offsets = [hour, MAX_IN_BEFORE_DAYS * day]
+		start_offsets = [hour - MAX_NEXT_UP_REPEATED_DAYS * day, hour - MAX_NEXT_UP_DAYS * day, -MAX_NEXT_UP_DAYS * day]
+		candidates = []
+		for times, offsets in [(self.ends, end_offsets), (self.sorted_starts, start_offsets)]:
+			for offset in offsets:
+				i = bisect.bisect_right(times, t - offset)
+				if i < len(times):
+					candidates.append(times[i] + offset)
+		if not candidates:
+			return None
+		return datetime.datetime.fromtimestamp(min(candidates) / 1000, tz)
+
+
+def event_index(entries):
+	if isinstance(entries, EventIndex):
+		return entries
+	return EventIndex(entries)
+
+
 def next_up(entries, now_):
+	index = event_index(entries)
 	repeated_events = {}
 
 	now = now_ - datetime.timedelta(hours=1)
 	far_far_away = now + datetime.timedelta(days=MAX_NEXT_UP_REPEATED_DAYS)
 	far_far_far_away = now + datetime.timedelta(days=MAX_NEXT_UP_DAYS)
+	# everything ending after this starts after far_far_far_away
+	horizon = far_far_far_away + datetime.timedelta(seconds=index.max_duration + 1)
 	result = []
-	for entry in sorted(entries):
-		if entry.end_datetime() > now:
-			# detect repeating events by name
-			eventid = entry.getPlainName()
-			if eventid not in repeated_events:
-				repeated_events[eventid] = 0
-			repeated_events[eventid] += 1
-			if repeated_events[eventid] > MAX_NEXT_UP_REPEATED:
-				continue
-			# repeated events only in the near future
-			if repeated_events[eventid] > 1 and entry.start_datetime() > far_far_away:
-				continue
+	for entry in index.ending_between(now, horizon):
+		# detect repeating events by name
+		eventid = entry.getPlainName()
+		if eventid not in repeated_events:
+			repeated_events[eventid] = 0
+		repeated_events[eventid] += 1
+		if repeated_events[eventid] > MAX_NEXT_UP_REPEATED:
+			continue
+		# repeated events only in the near future
+		if repeated_events[eventid] > 1 and entry.start_datetime() > far_far_away:
+			continue
 
-			# restrict all events to not so fare future
-			if entry.start_datetime() > far_far_far_away:
-				continue
+		# restrict all events to not so fare future
+		if entry.start_datetime() > far_far_far_away:
+			continue
 
-			result.append(entry)
+		result.append(entry)
 
 	return result
 
 
 def in_before(entries, now_):
+	index = event_index(entries)
 	repeated_events = {}
 	now = now_ - datetime.timedelta(hours=1)
 	lowest = now_ - datetime.timedelta(days=MAX_IN_BEFORE_DAYS)
 	result = []
-	for entry in sorted(entries, reverse=True):
-		if entry.end_datetime() < now and entry.end_datetime() > lowest:
-			# detect repeating events by nameyy
-			eventid = entry.getPlainName()
-			if eventid not in repeated_events:
-				repeated_events[eventid] = 0
-			repeated_events[eventid] += 1
-			if repeated_events[eventid] > MAX_IN_BEFORE_REPEATED:
-				continue
+	for entry in index.ending_between(lowest, now, reverse=True):
+		# detect repeating events by nameyy
+		eventid = entry.getPlainName()
+		if eventid not in repeated_events:
+			repeated_events[eventid] = 0
+		repeated_events[eventid] += 1
+		if repeated_events[eventid] > MAX_IN_BEFORE_REPEATED:
+			continue
 
-			result.append(entry)
+		result.append(entry)
 
 	return result
 
@@ -684,6 +1655,7 @@ def generate_wiki_section(entries, templatefile, lang=LANG_DE, now=None):
 	if now is None:
 		now = datetime.datetime.utcnow().replace(tzinfo=pytz.utc).astimezone(tz)
 	result = open(templatefile).read()
+	entries = event_index(entries)
 	next_dates = []
 	for i in next_up(entries, now):
 		next_dates.append(i.getMediawikiEntry(lang=lang))
@@ -696,14 +1668,288 @@ def generate_wiki_section(entries, templatefile, lang=LANG_DE, now=None):
 	return result.strip()
 
 
-def write_if_changed(filename, content):
-	if not os.path.exists(filename) or content != open(filename).read():
-		f = open(filename, "w")
-		f.write(content)
+def generate_wiki_sections(entries, sections, now=None, executor=None):
+	# renders generate_wiki_section for each (templatefile, lang) in
+	# sections at the same point in time, in parallel if an executor
+	# (concurrent.futures) is given
+	if now is None:
+		now = datetime.datetime.utcnow().replace(tzinfo=pytz.utc).astimezone(tz)
+	entries = event_index(entries)
+
+	def render(section):
+		templatefile, lang = section
+		return generate_wiki_section(entries, templatefile, lang, now)
+	if executor is None:
+		return [render(section) for section in sections]
+	return list(executor.map(render, sections))
+
+
+def temp_file(filename):
+	# temporary file in the directory of filename, so it can be renamed to
+	# filename atomically
+	fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)), suffix=".tmp")
+	return os.fdopen(fd, "wb"), tmp
+
+
+def replace_file(f, tmp, filename):
+	# syncs and closes the temporary file f and moves it to filename with
+	# the usual permissions. readers see either the old or the new file.
+	try:
+		f.flush()
+		os.fsync(f.fileno())
+		f.close()
+		umask = os.umask(0)
+		os.umask(umask)
+		os.chmod(tmp, 0o666 & ~umask)
+		os.replace(tmp, filename)
+	except BaseException:
+		f.close()
+		os.remove(tmp)
+		raise
+	try:
+		fd = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY)
+	except OSError:
+		return
+	try:
+		os.fsync(fd)
+	except OSError:
+		pass
+	finally:
+		os.close(fd)
+
+
+def write_bytes(filename, data):
+	f, tmp = temp_file(filename)
+	try:
+		f.write(data)
+	except BaseException:
+		f.close()
+		os.remove(tmp)
+		raise
+	replace_file(f, tmp, filename)
+
+
+def write_file(filename, content):
+	write_bytes(filename, content.encode("utf8"))
+
+
+def read_bytes(filename):
+	try:
+		with open(filename, "rb") as f:
+			return f.read()
+	except OSError:
+		return None
+
+
+def gzip_compress(data):
+	# gzip.compress(data, 9, mtime=0) needs python 3.8, a fixed mtime keeps
+	# the output the same for the same data
+	buf = io.BytesIO()
+	with gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=9, mtime=0) as f:
+		f.write(data)
+	return buf.getvalue()
+
+
+# precompressed siblings of the generated files, so the web server does not
+# have to compress them on every request. brotli is used only if installed.
+COMPRESSORS = {"gzip": (".gz", gzip_compress)}
+if brotli:
+	COMPRESSORS["br"] = (".br", brotli.compress)
+
+# sidecar with the ETag and Last-Modified headers of a generated file
+HEADERS_SUFFIX = ".headers"
+
+
+def compressed_names(filename, compress=()):
+	return [filename + COMPRESSORS[encoding][0] for encoding in compress if encoding in COMPRESSORS]
+
+
+def output_names(filename, compress=(), headers=False):
+	# all files written for filename, itself not included
+	names = compressed_names(filename, compress)
+	if headers:
+		names += [name + HEADERS_SUFFIX for name in [filename] + names]
+	return names
+
+
+def http_headers(filename, digest):
+	# a strong ETag from the content hash, Last-Modified is the time the
+	# content last changed, as files are only replaced if it changed
+	mtime = os.stat(filename).st_mtime
+	return 'ETag: "%s"\nLast-Modified: %s\n' % (digest, email.utils.formatdate(mtime, usegmt=True))
+
+
+def write_headers(filename, digest, changed=True, manifest=None):
+	# digest None reads the file, but only if the sidecar has to be written
+	sidecar = filename + HEADERS_SUFFIX
+	if not changed and (manifest.is_current(sidecar) if manifest else os.path.exists(sidecar)):
+		return
+	if digest is None:
+		digest = hashlib.sha256(read_bytes(filename)).hexdigest()
+	content = http_headers(filename, digest)
+	write_file(sidecar, content)
+	if manifest:
+		manifest.record(sidecar, hashlib.sha256(content.encode("utf8")).hexdigest())
+
+
+def write_compressed(filename, compress=(), changed=True, manifest=None, headers=False):
+	# (re)writes the compressed siblings of filename if it changed or a
+	# sibling is missing
+	data = None
+	for encoding in compress:
+		if encoding not in COMPRESSORS:
+			continue
+		suffix, compressor = COMPRESSORS[encoding]
+		sibling = filename + suffix
+		if not changed and (manifest.is_current(sibling) if manifest else os.path.exists(sibling)):
+			if headers:
+				write_headers(sibling, manifest.digest(sibling) if manifest else None, False, manifest)
+			continue
+		if data is None:
+			data = read_bytes(filename)
+		compressed = compressor(data)
+		digest = hashlib.sha256(compressed).hexdigest()
+		write_bytes(sibling, compressed)
+		if manifest:
+			manifest.record(sibling, digest)
+		if headers:
+			write_headers(sibling, digest, True, manifest)
+
+
+def finish_output(filename, digest, changed, manifest=None, compress=(), headers=False):
+	# the files that go along with filename after it was (re)written
+	if headers:
+		write_headers(filename, digest, changed, manifest)
+	write_compressed(filename, compress, changed, manifest, headers)
+
+
+def write_output(filename, content, manifest=None, compress=(), headers=False):
+	data = content.encode("utf8")
+	digest = hashlib.sha256(data).hexdigest()
+	if manifest:
+		changed = not manifest.matches(filename, digest)
+	else:
+		changed = data != read_bytes(filename)
+	if changed:
+		write_bytes(filename, data)
+		if manifest:
+			manifest.record(filename, digest)
+	finish_output(filename, digest, changed, manifest, compress, headers)
+	return changed
+
+
+def entries_fingerprint(entries):
+	h = hashlib.sha256(parser_version().encode("utf8"))
+	if isinstance(entries, OccurrenceStore):
+		h.update(entries.fingerprint().encode("utf8"))
+		return h.hexdigest()
+	for entry in entries:
+		h.update(entry.fingerprint().encode("utf8"))
+		h.update(b"\n")
+	return h.hexdigest()
+
+
+class OutputManifest(object):
+	# fingerprints of the entries each output was generated from and hashes
+	# of the written files, kept in MANIFEST_NAME inside `directory`
+	def __init__(self, directory="."):
+		self.filename = os.path.join(directory, MANIFEST_NAME)
+		try:
+			with open(self.filename) as f:
+				data = json.load(f)
+		except (OSError, ValueError):
+			data = {}
+		self.inputs = data.get("inputs", {})
+		self.files = data.get("files", {})
+
+	def save(self):
+		write_file(self.filename, json.dumps({"inputs": self.inputs, "files": self.files}, indent=1, sort_keys=True))
+
+	def file_state(self, filename):
+		try:
+			stat = os.stat(filename)
+		except OSError:
+			return None
+		return [stat.st_size, stat.st_mtime_ns]
+
+	def is_current(self, filename):
+		# the file is still the one we wrote last time
+		record = self.files.get(os.path.abspath(filename))
+		return record is not None and record["state"] == self.file_state(filename)
+
+	def unchanged(self, output, fingerprint, filenames):
+		return self.inputs.get(output) == fingerprint and all(self.is_current(f) for f in filenames)
+
+	def matches(self, filename, digest):
+		record = self.files.get(os.path.abspath(filename))
+		return record is not None and record["sha256"] == digest and self.is_current(filename)
+
+	def digest(self, filename):
+		# sha256 of filename when it was written, None if unknown
+		record = self.files.get(os.path.abspath(filename))
+		return record["sha256"] if record else None
+
+	def record(self, filename, digest):
+		self.files[os.path.abspath(filename)] = {"sha256": digest, "state": self.file_state(filename)}
+
+
+class HashingWriter(object):
+	def __init__(self, f):
+		self.f = f
+		self.hash = hashlib.sha256()
+
+	def write(self, text):
+		data = text.encode("utf8")
+		self.hash.update(data)
+		self.f.write(data)
+
+
+def write_stream_if_changed(filename, write, manifest=None, compress=(), headers=False):
+	# `write(out)` writes the content to a temporary file next to filename,
+	# which replaces filename only if the content changed
+	f, tmp = temp_file(filename)
+	try:
+		out = HashingWriter(f)
+		write(out)
+		f.flush()
+		digest = out.hash.hexdigest()
+		if manifest:
+			changed = not manifest.matches(filename, digest)
+		else:
+			changed = not os.path.exists(filename) or not filecmp.cmp(tmp, filename, shallow=False)
+	except BaseException:
+		f.close()
+		os.remove(tmp)
+		raise
+	if changed:
+		replace_file(f, tmp, filename)
+		if manifest:
+			manifest.record(filename, digest)
+	else:
 		f.close()
+		os.remove(tmp)
+	finish_output(filename, digest, changed, manifest, compress, headers)
+	return changed
 
 
-def generate_ical(entries, filename):
+def generate_ical(entries, filename, manifest=None, streaming=False, compress=(), headers=False):
+	if manifest:
+		fingerprint = entries_fingerprint(entries)
+		output = "ical:%s" % os.path.abspath(filename)
+		if manifest.unchanged(output, fingerprint, [filename] + output_names(filename, compress, headers)):
+			return
+	if streaming:
+		write_stream_if_changed(filename, lambda out: write_ical(entries, out), manifest, compress, headers)
+	else:
+		# note: to_ical() returns bytes, but this is not documented.
+		content = build_ical(entries).to_ical().decode("utf8")
+		write_output(filename, content, manifest, compress, headers)
+	if manifest:
+		manifest.inputs[output] = fingerprint
+		manifest.save()
+
+
+def build_ical(entries):
 	cal = ical.Calendar()
 	timezone = ical.cal.Timezone()
 	timezone.add('TZID', TIMEZONE)
@@ -736,29 +1982,169 @@ def generate_ical(entries, filename):
 		if component:
 			cal.add_component(component)
 
-	# note: to_ical() returns bytes, but this is not documented.
-	write_if_changed(filename, cal.to_ical().decode("utf8"))
-
-
-def generate_json_css(entries, jsonfile, cssfile):
-	e = []
-	css = []
+	return cal
+
+
+ICAL_HEADER = [
+	"BEGIN:VCALENDAR",
+	"VERSION:2.0",
+	"PRODID:-//willenbot",
+	"X-WR-CALNAME:Stratum 0",
+	"BEGIN:VTIMEZONE",
+	"TZID:%s" % TIMEZONE,
+	"X-LIC-LOCATION:%s" % TIMEZONE,
+	"BEGIN:STANDARD",
+	"DTSTART:19961027T030000",
+	"RRULE:FREQ=YEARLY;BYDAY=-1SU;BYMONTH=10",
+	"TZNAME:MEZ",
+	"TZOFFSETFROM:+0200",
+	"TZOFFSETTO:+0100",
+	"END:STANDARD",
+	"BEGIN:DAYLIGHT",
+	"DTSTART:19810329T020000",
+	"RRULE:FREQ=YEARLY;BYDAY=-1SU;BYMONTH=3",
+	"TZNAME:MESZ",
+	"TZOFFSETFROM:+0100",
+	"TZOFFSETTO:+0200",
+	"END:DAYLIGHT",
+	"END:VTIMEZONE"]
+
+
+def write_ical(entries, out):
+	# streaming alternative to the icalendar object tree in generate_ical,
+	# writes one VEVENT at a time to the file-like `out`
+	out.write("\r\n".join(ICAL_HEADER))
+	out.write("\r\n")
 	for entry in entries:
-		data = entry.getJson()
-		group = data["class"]
-		if group not in css:
-			css.append(group)
-		e.append(data)
-
-	result = {
-		"success": 1,
-		"result": e}
-
-	write_if_changed(jsonfile, json.dumps(result))
+		lines = entry.getIcalLines()
+		if lines:
+			out.write("BEGIN:VEVENT\r\n")
+			for line in lines:
+				out.write(ical_fold(line))
+				out.write("\r\n")
+			out.write("END:VEVENT\r\n")
+	out.write("END:VCALENDAR\r\n")
+
+
+def json_items(entries):
+	if isinstance(entries, OccurrenceStore):
+		return entries.json_items()
+	return (entry.getJson() for entry in entries)
+
+
+def write_json(entries, out, groups=None):
+	write_json_items(json_items(entries), out, groups)
+
+
+def write_json_items(items, out, groups=None):
+	# writes json.dumps({"success": 1, "result": [...]}) one event at a time,
+	# the css classes of the events are collected in `groups`
+	seen = set()
+	out.write('{"success": 1, "result": [')
+	for i, data in enumerate(items):
+		if groups is not None and data["class"] not in seen:
+			seen.add(data["class"])
+			groups.append(data["class"])
+		if i:
+			out.write(", ")
+		out.write(json.dumps(data))
+	out.write("]}")
+
+
+def shard_keys(start, end, period):
+	# shards (months or years) touched by an event from start to end (epoch
+	# milliseconds, end inclusive)
+	first = datetime.datetime.fromtimestamp(start / 1000, tz)
+	last = datetime.datetime.fromtimestamp(end / 1000, tz)
+	if period == "year":
+		return ["%04d" % year for year in range(first.year, last.year + 1)]
+	keys = []
+	year, month = first.year, first.month
+	while (year, month) <= (last.year, last.month):
+		keys.append("%04d-%02d" % (year, month))
+		year, month = year + month // 12, month % 12 + 1
+	return keys
+
+
+def shard_range(key):
+	# epoch milliseconds of [start, end) of a shard
+	parts = [int(part) for part in key.split("-")]
+	if len(parts) == 1:
+		start, end = datetime.datetime(parts[0], 1, 1), datetime.datetime(parts[0] + 1, 1, 1)
+	else:
+		year, month = parts
+		start = datetime.datetime(year, month, 1)
+		end = datetime.datetime(year + month // 12, month % 12 + 1, 1)
+	return int(tz.localize(start).timestamp() * 1000), int(tz.localize(end).timestamp() * 1000)
+
+
+def shard_index_name(jsonfile):
+	return "%s-index.json" % os.path.splitext(jsonfile)[0]
+
+
+def shard_files(jsonfile):
+	# the shard files listed in the current index of jsonfile
+	index_file = shard_index_name(jsonfile)
+	try:
+		with open(index_file) as f:
+			shards = json.load(f)["shards"]
+	except (OSError, ValueError, KeyError):
+		return []
+	return [os.path.join(os.path.dirname(index_file), shard["file"]) for shard in shards]
+
+
+def generate_json_shards(entries, jsonfile, period="month", manifest=None, compress=(), headers=False):
+	# writes the events of each month (or year) to <jsonfile>-<key>.json,
+	# listed in <jsonfile>-index.json. only changed shards are rewritten,
+	# shards that are no longer needed are removed
+	shards = {}
+	for data in json_items(entries):
+		for key in shard_keys(data["start"], data["end"], period):
+			shards.setdefault(key, []).append(data)
+
+	stem = os.path.splitext(jsonfile)[0]
+	index_file = shard_index_name(jsonfile)
+	index = []
+	for key in sorted(shards):
+		filename = "%s-%s.json" % (stem, key)
+		write_stream_if_changed(filename, lambda out: write_json_items(shards[key], out), manifest, compress, headers)
+		start, end = shard_range(key)
+		index.append({"key": key, "file": os.path.basename(filename), "start": start, "end": end})
+
+	files = set(shard["file"] for shard in index)
+	for filename in shard_files(jsonfile):
+		if os.path.basename(filename) not in files:
+			for name in [filename] + output_names(filename, COMPRESSORS, True):
+				if os.path.exists(name):
+					os.remove(name)
+	content = json.dumps({"period": period, "shards": index})
+	write_output(index_file, content, manifest, compress, headers)
+
+
+def generate_json_css(entries, jsonfile, cssfile, manifest=None, shards=None, compress=(), headers=False):
+	if manifest:
+		fingerprint = entries_fingerprint(entries)
+		output = "json_css:%s" % os.path.abspath(jsonfile)
+		outputs = [jsonfile, cssfile]
+		if shards:
+			output += ":%s" % shards
+			# a missing or changed shard has to be written again as well
+			outputs.append(shard_index_name(jsonfile))
+			outputs += shard_files(jsonfile)
+		outputs += [name for f in outputs for name in output_names(f, compress, headers)]
+		if manifest.unchanged(output, fingerprint, outputs):
+			return
+	css = []
+	write_stream_if_changed(jsonfile, lambda out: write_json(entries, out, css), manifest, compress, headers)
+	if shards:
+		generate_json_shards(entries, jsonfile, shards, manifest, compress, headers)
 
 	css_content = ""
 	for group in css:
 		(r, g, b) = hashlib.md5(group.encode("utf8")).hexdigest()[:3]
 		color = r + "f" + g + "f" + b + "f"
 		css_content += ".{name},.dh-{name} {{background-color:#{color};}}\n".format(name=group, color=color)
-	write_if_changed(cssfile, css_content)
+	write_output(cssfile, css_content, manifest, compress, headers)
+	if manifest:
+		manifest.inputs[output] = fingerprint
+		manifest.save()
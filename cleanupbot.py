@@ -1,51 +1,59 @@
 #!/usr/bin/env python3
 # -.- encoding: utf-8 -.-
-import mwclient
-import config
+import wikiclient
 import calendargenerator
 import datetime
 
 import pytz
 
-site = mwclient.Site((config.protocol, config.server), path="/mediawiki/")
 
-termine = site.Pages["Termine"]
-termine_archiv = site.Pages["Termine/Archiv"]
+def run(site, config):
+	# both pages with a single request
+	pages = site.fetch(["Termine", "Termine/Archiv"])
+	termine_text = pages["Termine"]["text"]
+	termine_archiv_text = pages["Termine/Archiv"]["text"]
 
-termine_text = termine.text()
-termine_archiv_text = termine_archiv.text()
+	threshold_date = datetime.datetime.utcnow().replace(tzinfo=pytz.utc).astimezone(calendargenerator.tz) - datetime.timedelta(days=config.archive_threshold_days)
 
-threshold_date = datetime.datetime.utcnow().replace(tzinfo=pytz.utc).astimezone(calendargenerator.tz) - datetime.timedelta(days=config.archive_threshold_days)
+	cache = None
+	if getattr(config, "parse_cache", None):
+		cache = calendargenerator.ParseCache(config.parse_cache)
 
+	# large pages are tokenized by parse_workers processes
+	new_termine_text, new_termine_archiv_text, n = calendargenerator.move_to_archive(termine_text, termine_archiv_text, threshold_date, cache, getattr(config, "parse_workers", None))
 
-new_termine_text, new_termine_archiv_text, n = calendargenerator.move_to_archive(termine_text, termine_archiv_text, threshold_date)
+	termine_changed = False
+	archiv_changed = False
 
+	if termine_text != new_termine_text:
+		print("termine changed")
+		termine_changed = True
 
-termine_changed = False
-archiv_changed = False
+	if termine_archiv_text != new_termine_archiv_text:
+		print("archiv changed")
+		archiv_changed = True
 
-if termine_text != new_termine_text:
-	print("termine changed")
-	termine_changed = True
+	comment = u"Termine cleanup"
+	if n > 0:
+		comment = u"%d Termine ins Archiv verschoben" % n
 
-if termine_archiv_text != new_termine_archiv_text:
-	print("archiv changed")
-	archiv_changed = True
+	minor_edit = n == 0
 
-comment = u"Termine cleanup"
-if n > 0:
-	comment = u"%d Termine ins Archiv verschoben" % n
+	if termine_changed or archiv_changed:
+		print(">", comment)
+		print("minor:", minor_edit)
 
-minor_edit = n == 0
+	if config.write_wiki and (termine_changed or archiv_changed):
+		if not site.logged_in:
+			site.login(config.user, config.password)
+		edits = []
+		if termine_changed:
+			edits.append(("Termine", new_termine_text, comment, minor_edit))
+		if archiv_changed:
+			edits.append(("Termine/Archiv", new_termine_archiv_text, comment, minor_edit))
+		site.save_many(edits)
 
-if termine_changed or archiv_changed:
-	print(">", comment)
-	print("minor:", minor_edit)
 
-if config.write_wiki and (termine_changed or archiv_changed):
-	if not site.logged_in:
-		site.login(config.user, config.password)
-	if termine_changed:
-		termine.save(new_termine_text, comment, minor=minor_edit)
-	if archiv_changed:
-		termine_archiv.save(new_termine_archiv_text, comment, minor=minor_edit)
+if __name__ == "__main__":
+	import config
+	run(wikiclient.Site((config.protocol, config.server), path="/mediawiki/"), config)
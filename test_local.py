@@ -1,15 +1,15 @@
 #!/usr/bin/env python3
 # -.- encoding: utf-8 -.-
-import mwclient
+import wikiclient
 import datetime
 import time
 import calendargenerator
 
-site = mwclient.Site(('https', 'stratum0.org'), path="/mediawiki/")
+site = wikiclient.Site(('https', 'stratum0.org'), path="/mediawiki/")
 
 termine = site.Pages["Termine"]
 data = termine.text()
-parsed = calendargenerator.expand_dates(calendargenerator.parse_wiki_page(data))
+parsed = calendargenerator.expand_dates(calendargenerator.parse_wiki_page(data), *calendargenerator.wiki_section_window())
 
 print(calendargenerator.generate_wiki_section(parsed, "templates/termine_haupt.de.wiki", calendargenerator.LANG_DE))
 print("-" * 20)
@@ -2,3 +2,5 @@ from .dates import *
 from .parser import *
 from .misc import *
 from .generators import *
+from .api import *
+from .bots import *
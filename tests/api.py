@@ -0,0 +1,115 @@
+# -.- coding: utf8 -.-
+
+import unittest
+import asyncio
+import concurrent.futures
+import time
+import wikiclient
+from .fakewiki import FakeWiki
+
+
+class TestWikiClient(unittest.TestCase):
+	def setUp(self):
+		self.wiki = FakeWiki({"Termine": "== Events ==", "Template:Termine/de": "alt", u"Français": "accueil"})
+		self.site = wikiclient.Site(("http", self.wiki.host), path="/mediawiki/")
+
+	def tearDown(self):
+		self.site.close()
+		self.wiki.stop()
+
+	def test_text(self):
+		self.assertEqual(self.site.Pages["Termine"].text(), "== Events ==")
+		self.assertEqual(self.site.Pages["Termine"].text(), "== Events ==")
+		self.assertEqual(self.site.Pages["does not exist"].text(), "")
+		self.assertEqual(len(self.wiki.requests), 2)
+
+	def test_revisions(self):
+		rev = self.site.Pages["Termine"].revisions(limit=1, prop='timestamp|user|comment').next()
+		self.assertEqual(rev["user"], "admin")
+		self.assertIsInstance(rev["timestamp"], time.struct_time)
+		self.assertLess(abs(time.mktime(rev["timestamp"]) - time.mktime(time.gmtime())), 60)
+		self.assertEqual(list(self.site.Pages["does not exist"].revisions()), [])
+
+	def test_batchedFetch(self):
+		titles = ["Termine", "Template:Termine/de", u"Français", "does not exist"]
+		pages = self.site.fetch(titles)
+		self.assertEqual([pages[title]["text"] for title in titles], ["== Events ==", "alt", "accueil", ""])
+		self.assertEqual([self.site.Pages[title].text() for title in titles], ["== Events ==", "alt", "accueil", ""])
+		self.assertEqual(pages["Termine"]["user"], "admin")
+		self.assertEqual(pages["does not exist"]["revid"], None)
+		self.assertEqual(len(self.wiki.requests), 1)
+		self.assertEqual(self.wiki.requests[0]["prop"], "revisions")
+
+		# more titles than a single request may contain
+		pages = self.site.run(self.site.api.pages(["Page %d" % i for i in range(wikiclient.MAX_TITLES + 1)]))
+		self.assertEqual(len(pages), wikiclient.MAX_TITLES + 1)
+		self.assertEqual(len(self.wiki.requests), 3)
+
+	def test_saveAndPurge(self):
+		self.assertRaises(wikiclient.LoginError, self.site.login, "bot", "wrong")
+		self.assertFalse(self.site.logged_in)
+		page = self.site.Pages["Template:Termine/de"]
+		self.assertRaises(wikiclient.APIError, page.save, "neu", "test")
+
+		self.site.login("bot", "secret")
+		self.assertTrue(self.site.logged_in)
+		page.save("neu", "test", minor=True)
+		self.assertEqual(page.text(), "neu")
+		self.assertEqual(page.revisions().next()["comment"], "test")
+		self.assertEqual(self.wiki.actions("edit")[-1]["minor"], "1")
+		page.purge()
+		self.assertEqual(self.wiki.actions("purge")[0]["titles"], "Template:Termine/de")
+
+	def test_pipelinedWrites(self):
+		self.site.login("bot", "secret")
+		edits = [("Template:Termine/%s" % lang, lang, "update", True) for lang in ["de", "en", "fr"]]
+		self.site.save_many(edits)
+		self.site.purge(["Hauptseite", "English", u"Français"])
+		self.assertEqual([self.wiki.pages["Template:Termine/%s" % lang]["content"] for lang in ["de", "en", "fr"]], ["de", "en", "fr"])
+		csrf = [params for params in self.wiki.requests if params.get("type") == "csrf"]
+		self.assertEqual(len(csrf), 1)
+		self.assertEqual(len(self.wiki.actions("purge")), 1)
+
+	def test_editConflict(self):
+		self.site.login("bot", "secret")
+		self.site.fetch(["Termine", "Template:Termine/de"])
+		self.wiki.edit("Termine", "== Events ==\n* someone else", "admin", "")
+		with self.assertRaises(wikiclient.APIError) as context:
+			self.site.save_many([("Termine", "cleaned up", "cleanup", False)])
+		self.assertEqual(context.exception.code, "editconflict")
+		self.assertEqual(self.wiki.pages["Termine"]["content"], "== Events ==\n* someone else")
+
+		# without a change in between the edit goes through, as a bot edit
+		self.site.save_many([("Template:Termine/de", "neu", "update", True)])
+		self.assertEqual(self.wiki.pages["Template:Termine/de"]["content"], "neu")
+		edit = self.wiki.actions("edit")[-1]
+		self.assertEqual((edit["bot"], edit["assert"]), ("1", "user"))
+		self.assertIn("basetimestamp", edit)
+		self.assertIn("starttimestamp", edit)
+
+	def test_connectionReuse(self):
+		for i in range(10):
+			self.site.run(self.site.api.pages(["Termine"]))
+		self.assertEqual(self.wiki.connections, 1)
+
+		def fetch(title):
+			return self.site.Pages[title].text()
+		with concurrent.futures.ThreadPoolExecutor(8) as executor:
+			texts = list(executor.map(fetch, ["Page %d" % i for i in range(32)]))
+		self.assertEqual(texts, [""] * 32)
+		self.assertLessEqual(self.wiki.connections, wikiclient.POOL_SIZE)
+
+	def test_async(self):
+		api = wikiclient.AsyncSite(self.wiki.host, scheme="http")
+
+		async def run():
+			pages = await asyncio.gather(api.pages(["Termine"]), api.pages([u"Français"]))
+			return [page for result in pages for page in result.values()]
+		loop = asyncio.new_event_loop()
+		try:
+			pages = loop.run_until_complete(run())
+		finally:
+			loop.close()
+			api.close()
+		self.assertEqual([page["text"] for page in pages], ["== Events ==", "accueil"])
+		self.assertEqual([page["revid"] for page in pages], [1, 3])
@@ -0,0 +1,110 @@
+# -.- coding: utf8 -.-
+
+import unittest
+import datetime
+import tempfile
+import shutil
+import os
+import types
+import json
+import time
+import bot
+import cleanupbot
+import wikiclient
+from .fakewiki import FakeWiki
+
+
+class TestBots(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		today = datetime.date.today()
+		soon, recently = today + datetime.timedelta(days=3), today - datetime.timedelta(days=3)
+		self.termine = """== Events ==
+{| class="prettytable"
+! Event !! Termin !! Im Zeitraum
+|-
+| Soon || %s 19:00 ||
+|-
+| Recently || %s 19:00 ||
+|}
+""" % (soon.strftime("%d.%m.%Y"), recently.strftime("%d.%m.%Y"))
+		self.wiki = FakeWiki({"Termine": self.termine, "Termine/Archiv": open("tests/wiki/general.wiki").read(), "Template:Termine/de": "alt"})
+		self.site = wikiclient.Site(("http", self.wiki.host))
+		self.config = types.SimpleNamespace(user="bot", password="secret", write_wiki=True, archive_threshold_days=31,
+			ical=os.path.join(self.directory, "events.ics"), json=os.path.join(self.directory, "events.json"),
+			css=os.path.join(self.directory, "category.css"))
+
+	def tearDown(self):
+		self.site.close()
+		self.wiki.stop()
+		shutil.rmtree(self.directory)
+
+	def test_bot(self):
+		bot.run(self.site, self.config)
+		self.assertEqual(self.wiki.requests[0]["titles"], "Termine|Template:Termine/de|Template:Termine/en|Template:Termine/fr")
+		self.assertEqual(len(self.wiki.actions("edit")), 3)
+		self.assertEqual(self.wiki.actions("purge")[0]["titles"], u"Hauptseite|English|Français")
+		self.assertIn("Soon", self.wiki.pages["Template:Termine/en"]["content"])
+		self.assertTrue(os.path.exists(self.config.ical))
+
+		# nothing changed: a single request
+		del self.wiki.requests[:]
+		bot.run(self.site, self.config)
+		self.assertEqual(len(self.wiki.requests), 1)
+
+	def test_skipUnchanged(self):
+		self.config.state = os.path.join(self.directory, "state.json")
+		bot.run(self.site, self.config)
+		self.assertEqual(len(self.wiki.actions("edit")), 3)
+
+		# only the revision of Termine is checked
+		del self.wiki.requests[:]
+		bot.run(self.site, self.config)
+		self.assertEqual(len(self.wiki.requests), 1)
+		self.assertEqual((self.wiki.requests[0]["titles"], self.wiki.requests[0]["rvprop"]), ("Termine", "ids"))
+
+		# Termine was edited
+		self.wiki.edit("Termine", self.termine.replace("Soon", "Later"), "admin", "")
+		del self.wiki.requests[:]
+		bot.run(self.site, self.config)
+		self.assertEqual(self.wiki.requests[1]["rvprop"], "ids|timestamp|user|comment|content")
+		self.assertIn("Later", self.wiki.pages["Template:Termine/en"]["content"])
+		del self.wiki.requests[:]
+		bot.run(self.site, self.config)
+		self.assertEqual(len(self.wiki.requests), 1)
+
+		# the sections change with time
+		state = json.load(open(self.config.state))
+		self.assertGreater(state["next_change"], time.time())
+		state["next_change"] = time.time() - 1
+		json.dump(state, open(self.config.state, "w"))
+		del self.wiki.requests[:]
+		bot.run(self.site, self.config)
+		self.assertEqual(len(self.wiki.requests), 2)
+
+		# a state from an older version without next_change means a full run
+		del state["next_change"]
+		json.dump(state, open(self.config.state, "w"))
+		del self.wiki.requests[:]
+		bot.run(self.site, self.config)
+		self.assertEqual(len(self.wiki.requests), 2)
+		self.assertIn("next_change", json.load(open(self.config.state)))
+		for state in [{}, {"revid": 1}, [], {"next_change": None}]:
+			self.assertFalse(bot.up_to_date(state, 1, datetime.datetime.now(datetime.timezone.utc)))
+
+	def test_cleanupbot(self):
+		self.config.archive_threshold_days = 100000
+		cleanupbot.run(self.site, self.config)
+		self.assertEqual(self.wiki.requests[0]["titles"], "Termine|Termine/Archiv")
+
+		# nothing to clean up: a single request
+		del self.wiki.requests[:]
+		cleanupbot.run(self.site, self.config)
+		self.assertEqual(len(self.wiki.requests), 1)
+		del self.wiki.requests[:]
+
+		self.config.archive_threshold_days = 1
+		cleanupbot.run(self.site, self.config)
+		self.assertEqual(sorted(params["title"] for params in self.wiki.actions("edit")), ["Termine", "Termine/Archiv"])
+		self.assertIn("Recently", self.wiki.pages["Termine/Archiv"]["content"])
+		self.assertNotIn("Recently", self.wiki.pages["Termine"]["content"])
@@ -1,6 +1,8 @@
 import unittest
 import calendargenerator as cg
 import datetime
+import pickle
+import random
 
 
 class TestDateOrder(unittest.TestCase):
@@ -117,6 +119,28 @@ class TestDateOrder(unittest.TestCase):
 		self.assertTrue(self.dtr1 < self.dtr2)
 		self.assertTrue(self.dtr2 > self.dtr1)
 
+	def test_sortKey(self):
+		entries = [self.sd1, self.sd2, self.sdt1, self.sdt2, self.sdt3, self.sdt4, self.sdt5,
+			self.sdtr1, self.sdtr2, self.sdtr4, self.sdtr5, self.dr2, self.dtr2]
+		for a in entries:
+			for b in entries:
+				if a is b or (a < b) == (b < a):
+					# equal or nested, where the operators do not define an order
+					continue
+				self.assertEqual(a < b, a.sort_key() < b.sort_key())
+
+	def test_sortKeyNested(self):
+		# nested events are ordered by end, then start, then name, whatever
+		# order they come in; the comparison operators do not decide these
+		long_range = cg.DateRange("Long", "cat", (1, 12, 2014, 31, 12, 2014))
+		short = cg.SingleDateTimeRange("Short", "cat", (10, 12, 2014, 12, 00, 14, 00))
+		same_end = cg.DateTimeRange("Same end", "cat", (9, 12, 2014, 12, 00, 10, 12, 2014, 14, 00))
+		same_a = cg.SingleDateTimeRange("A", "cat", (10, 12, 2014, 12, 00, 14, 00))
+		expected = [same_end, same_a, short, long_range]
+		self.assertTrue(long_range < short and short < long_range)
+		for entries in (expected, expected[::-1], [short, long_range, same_a, same_end]):
+			self.assertEqual(sorted(entries, key=cg.entry_sort_key), expected)
+
 	def test_WeekdayGeneratorEntries(self):
 		generator = cg.WeekdayTimeGenerator("Event something", "cats", ("Mo", 13, 15), "01.06.2015 - 29.06.2015")
 		start = generator.entries[0].start_datetime()
@@ -130,6 +154,32 @@ class TestDateOrder(unittest.TestCase):
 		self.assertEqual(end.year, 2015)
 		self.assertEqual(len(generator.entries), 5)
 
+	def test_WeekdayGeneratorEntriesBetween(self):
+		generator = cg.WeekdayTimeGenerator("Event something", "cats", ("Mo", 13, 15), "01.06.2015 - 29.06.2015")
+		start = cg.tz.localize(datetime.datetime(2015, 6, 10))
+		end = cg.tz.localize(datetime.datetime(2015, 6, 22, 13, 15))
+		between = generator.entries_between(start, end)
+		self.assertEqual([entry.start_date.day for entry in between], [15])
+		self.assertIsNone(generator._entries)
+		self.assertEqual(generator.last_entry().start_date.day, 29)
+		self.assertEqual(generator.entries_between(start, end), between)
+
+	def test_WeekdayGeneratorEntriesBetweenDST(self):
+		start = cg.tz.localize(datetime.datetime(2015, 3, 20))
+		end = cg.tz.localize(datetime.datetime(2015, 11, 2))
+		generator = cg.WeekdayTimeRangeGenerator("name", "cat", ("Sa/2", 23, 30, 0, 30), "1.1.2015 - 31.12.2015")
+		lazy = generator.entries_between(start, end)
+		full = [entry for entry in generator.entries if entry.end_datetime() > start and entry.start_datetime() < end]
+		self.assertEqual(lazy, full)
+		self.assertTrue(all(entry.start_date.hour == 23 for entry in lazy))
+
+	def test_WeekdayGeneratorLastOccurrence(self):
+		generator = cg.WeekdayTimeGenerator("name", "cat", ("Mo", 0, 0), "13.04.2011 - 27.10.2013")
+		self.assertEqual(generator.last_occurrence(), generator.rule.before(generator.rule._until, inc=True))
+		self.assertEqual(generator.last_entry(), generator.entries[-1])
+		generator = cg.WeekdayTimeGenerator("name", "cat", ("Mi/3", 19, 0), "01.01.2015 - 31.12.2015")
+		self.assertEqual(generator.last_occurrence(), generator.rule.before(generator.rule._until, inc=True))
+
 	def test_WeekdayMidnight(self):
 		generator = cg.WeekdayTimeRangeGenerator("name", "cat", ("do", 23, 0, 3, 14), ("1.1.2014 - 31.12.2014"))
 		self.assertTrue((generator.entries[0].end_datetime() - generator.entries[0].start_datetime()).total_seconds() > 0)
@@ -139,3 +189,116 @@ class TestDateOrder(unittest.TestCase):
 
 	def test_BrokenWeekdayRange2(self):
 		generator = cg.WeekdayTimeRangeGenerator("name", "cat", ("Do+2", 23, 0, 3, 14), ("1.1.2014 - 31.12.2014"))
+
+	def test_WeekdayOccurrences(self):
+		# occurrences share their series and only keep the start. 2:30 does
+		# not exist on 29.03.2015, it is ambiguous on 25.10.2015
+		generator = cg.WeekdayTimeRangeGenerator("name", "cat", ("So", "2", "30", "4", "00"), "1.3.2015 - 30.11.2015")
+		entries = generator.entries
+		self.assertTrue(all(entry.series is generator.series for entry in entries))
+		self.assertFalse(hasattr(entries[0], "__dict__"))
+		self.assertIsInstance(entries[0], cg.DatePrinter)
+		self.assertIsInstance(entries[0], cg.SingleDateTimeRange)
+		self.assertIsInstance(cg.WeekdayTimeGenerator("name", "cat", ("So", "12", "00"), "1.3.2015 - 30.11.2015").entries[0], cg.SingleDateTime)
+		for entry in entries:
+			day = entry.start_date.replace(tzinfo=None)
+			self.assertEqual((day.hour, day.minute), (2, 30))
+			self.assertEqual(entry.start_date, cg.tz.localize(day))
+			self.assertEqual(entry.end_date, cg.tz.localize(day.replace(hour=4, minute=0)))
+		self.assertEqual(sorted(generator.series.exceptions), sorted(int(entry.start_date.timestamp()) for entry in entries if entry.start_date.month == 3 and entry.start_date.day == 29))
+		self.assertEqual(pickle.loads(pickle.dumps(entries)), entries)
+
+	def test_WeekdayTimestamps(self):
+		# the week arithmetic of Series.timestamps() gives the same starts and
+		# ends as localizing every event of the rule like the generator used
+		# to, for random series with many times close to the dst changes
+		rnd = random.Random(0)
+		for i in range(200):
+			values = (rnd.choice(["Mo", "Mi/3", "Sa", "So", "So/2"]), str(rnd.choice([0, 1, 2, 3, 23, rnd.randint(0, 23)])), str(rnd.choice([0, 30])))
+			if rnd.random() < 0.7:
+				values += (str(rnd.choice([0, 2, 3, 4, rnd.randint(0, 23)])), str(rnd.choice([0, 15])))
+			else:
+				values += (None, None)
+			year = rnd.randint(2010, 2040)
+			rep = "%d.%d.%d - %d.%d.%d" % (rnd.randint(1, 28), rnd.randint(1, 12), year, rnd.randint(1, 28), rnd.randint(1, 12), year + rnd.randint(0, 2))
+			try:
+				series = cg.WeekdayTimeRangeGenerator("name", "cat", values, rep).series
+			except cg.InvalidDateEntryException:
+				# a time in a dst gap, see test_parseWiki_dstGap
+				continue
+			starts = []
+			ends = []
+			for event in series.rule:
+				naive = datetime.datetime(event.year, event.month, event.day, event.hour, event.minute)
+				start = cg.tz.localize(naive)
+				starts.append(int(start.timestamp()))
+				if series.nonetime:
+					ends.append(int((start + datetime.timedelta(hours=cg.DEFAULT_DURATION)).timestamp()))
+				else:
+					end = cg.tz.localize(naive + series.delta)
+					# SingleDateTimeRange moves an end before the start to the next day
+					if end.day == start.day and end < start:
+						end += datetime.timedelta(days=1)
+					ends.append(int(end.timestamp()))
+			self.assertEqual(list(series.timestamps()), starts, (values, rep))
+			self.assertEqual(list(series.end_timestamps(series.timestamps())), ends, (values, rep))
+
+
+class TestEventIndex(unittest.TestCase):
+	def setUp(self):
+		self.generator = cg.WeekdayTimeRangeGenerator("weekly", "cat", ("Mo", 18, 0, 20, 0), "01.09.2014 - 29.09.2014")
+		self.single = cg.SingleDate("single", "cat", [10, 9, 2014])
+		self.range = cg.DateRange("range", "cat", [14, 9, 2014, 16, 9, 2014])
+		self.entries = cg.expand_dates([self.generator, self.single, self.range])
+		self.index = cg.EventIndex(self.entries)
+
+	def at(self, day, hour=0):
+		return cg.tz.localize(datetime.datetime(2014, 9, day, hour))
+
+	def test_order(self):
+		self.assertEqual(list(self.index), sorted(self.entries, key=cg.entry_sort_key))
+		self.assertEqual(len(self.index), 7)
+
+	def test_overlapping(self):
+		result = self.index.overlapping(self.at(8, 19), self.at(15, 19))
+		self.assertEqual([entry.name for entry in result], ["weekly", "single", "weekly", "range"])
+		self.assertEqual(self.index.overlapping(self.at(2), self.at(8)), [])
+
+	def test_nextLast(self):
+		self.assertEqual(self.index.next_after(self.at(10, 12), 2), [self.single, self.entries[2]])
+		self.assertEqual(self.index.last_before(self.at(10, 12), 2), [self.entries[1], self.entries[0]])
+		self.assertEqual(self.index.ending_between(self.at(10, 12), self.at(17, 1)), [self.single, self.entries[2], self.range])
+
+	def test_startingBefore(self):
+		self.assertEqual(len(self.index.starting_before(self.at(15, 18))), 4)
+		index = cg.EventIndex([self.generator, self.single])
+		self.assertEqual(index.starting_before(self.at(29, 18)), [self.single])
+
+	def test_nextUpInBefore(self):
+		now = self.at(15, 12)
+		self.assertEqual(cg.next_up(self.index, now), cg.next_up(self.entries, now))
+		self.assertEqual(cg.in_before(self.index, now), cg.in_before(self.entries, now))
+		self.assertEqual(len(cg.next_up(self.index, now)), 4)
+		self.assertEqual(len(cg.in_before(self.index, now)), 2)
+
+	def test_nextChange(self):
+		entries = [self.generator, self.single, self.range, cg.SingleDateTime("later", "cat", [20, 12, 2014, 19, 0])]
+		index = cg.EventIndex(cg.expand_dates(entries))
+
+		def sections(now):
+			expanded = cg.expand_dates(entries, *cg.wiki_section_window(now))
+			return [[entry.sort_key() for entry in section] for section in [cg.next_up(expanded, now), cg.in_before(expanded, now)]]
+
+		now = self.at(1)
+		for i in range(20):
+			change = index.next_change(now)
+			self.assertGreater(change, now)
+			# a threshold at now itself is crossed just after now
+			t = now + datetime.timedelta(seconds=1)
+			expected = sections(t)
+			while t < change:
+				self.assertEqual(sections(t), expected)
+				t += datetime.timedelta(hours=2)
+			self.assertEqual(sections(change - datetime.timedelta(seconds=1)), expected)
+			now = change
+		self.assertEqual(index.next_change(cg.tz.localize(datetime.datetime(2015, 3, 1))), None)
@@ -0,0 +1,129 @@
+# -.- coding: utf8 -.-
+# a local stand-in for the parts of the MediaWiki API used by the bots
+
+import http.server
+import json
+import socketserver
+import threading
+import time
+import urllib.parse
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+	# http.server.ThreadingHTTPServer needs python 3.7
+	daemon_threads = True
+
+
+class FakeWiki(object):
+	def __init__(self, pages=None, user="bot", password="secret"):
+		self.pages = {}
+		self.revid = 0
+		self.clock = 0
+		for title, text in (pages or {}).items():
+			self.edit(title, text, "admin", "")
+		self.user = user
+		self.password = password
+		self.requests = []
+		self.connections = 0
+		self.lock = threading.Lock()
+
+		wiki = self
+
+		class Handler(http.server.BaseHTTPRequestHandler):
+			protocol_version = "HTTP/1.1"
+			wbufsize = -1
+
+			def setup(self):
+				http.server.BaseHTTPRequestHandler.setup(self)
+				with wiki.lock:
+					wiki.connections += 1
+
+			def do_GET(self):
+				self.answer(urllib.parse.urlsplit(self.path).query)
+
+			def do_POST(self):
+				self.answer(self.rfile.read(int(self.headers["Content-Length"])).decode("utf8"))
+
+			def answer(self, query):
+				params = dict(urllib.parse.parse_qsl(query))
+				cookies = self.headers.get("Cookie", "")
+				with wiki.lock:
+					wiki.requests.append(params)
+					result, cookie = wiki.handle(params, cookies)
+				data = json.dumps(result).encode("utf8")
+				self.send_response(200)
+				self.send_header("Content-Type", "application/json")
+				self.send_header("Content-Length", str(len(data)))
+				if cookie:
+					self.send_header("Set-Cookie", cookie)
+				self.end_headers()
+				self.wfile.write(data)
+
+			def log_message(self, *args):
+				pass
+
+		self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+		self.host = "127.0.0.1:%d" % self.server.server_address[1]
+		self.thread = threading.Thread(target=self.server.serve_forever, args=(0.01,), daemon=True)
+		self.thread.start()
+
+	def stop(self):
+		self.server.shutdown()
+		self.server.server_close()
+
+	def now(self):
+		# a clock that advances with every edit, so that each revision has
+		# its own timestamp even within a second
+		self.clock = max(int(time.time()), self.clock)
+		return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.clock))
+
+	def edit(self, title, text, user, comment):
+		self.revid += 1
+		self.pages[title] = {"revid": self.revid, "content": text, "user": user, "comment": comment, "timestamp": self.now()}
+		self.clock += 1
+
+	def actions(self, action):
+		return [params for params in self.requests if params.get("action") == action]
+
+	def handle(self, params, cookies):
+		action = params.get("action")
+		logged_in = "session=%s" % self.user in cookies
+		if action == "query" and "meta" in params:
+			if params.get("type") == "login":
+				return {"query": {"tokens": {"logintoken": "login+\\"}}}, None
+			return {"query": {"tokens": {"csrftoken": "csrf+\\" if logged_in else "+\\"}}}, None
+		if action == "query":
+			pages = []
+			for title in params["titles"].split("|"):
+				if title not in self.pages:
+					pages.append({"title": title, "missing": True})
+					continue
+				page = self.pages[title]
+				rvprop = params.get("rvprop", "ids|timestamp|flags|comment|user").split("|")
+				revision = dict((key, page[key]) for key in ["user", "comment", "timestamp"] if key in rvprop)
+				if "ids" in rvprop:
+					revision["revid"] = page["revid"]
+				if "content" in rvprop:
+					revision["slots"] = {"main": {"content": page["content"]}}
+				pages.append({"title": title, "revisions": [revision]})
+			result = {"batchcomplete": True, "query": {"pages": pages}}
+			if params.get("curtimestamp"):
+				result["curtimestamp"] = self.now()
+			return result, None
+		if action == "login":
+			if params.get("lgtoken") != "login+\\" or (params.get("lgname"), params.get("lgpassword")) != (self.user, self.password):
+				return {"login": {"result": "Failed", "reason": "wrong password"}}, None
+			return {"login": {"result": "Success"}}, "session=%s; path=/" % self.user
+		if action == "edit":
+			if not logged_in or params.get("token") != "csrf+\\":
+				return {"error": {"code": "badtoken", "info": "Invalid CSRF token."}}, None
+			if params.get("assert") == "user" and not logged_in:
+				return {"error": {"code": "assertuserfailed", "info": "You are no longer logged in."}}, None
+			page = self.pages.get(params["title"])
+			if page and "basetimestamp" in params and page["timestamp"] != params["basetimestamp"]:
+				return {"error": {"code": "editconflict", "info": "Edit conflict."}}, None
+			self.edit(params["title"], params["text"], self.user, params.get("summary", ""))
+			return {"edit": {"result": "Success", "title": params["title"], "newrevid": self.revid}}, None
+		if action == "purge":
+			return {"purge": [{"title": title, "purged": True} for title in params["titles"].split("|")]}, None
+		return {"error": {"code": "badvalue", "info": "Unrecognized action"}}, None
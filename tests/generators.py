@@ -3,6 +3,15 @@ import calendargenerator as cg
 import tempfile
 import os
 import datetime
+import shutil
+import json
+import io
+import icalendar as ical
+import gzip
+import concurrent.futures
+import hashlib
+import email.utils
+import time
 
 
 class TestGenerators(unittest.TestCase):
@@ -22,15 +31,289 @@ class TestGenerators(unittest.TestCase):
 			cg.SingleDate("Event -1", "cat", (6, 10, 2014)),
 			cg.SingleDate("Event -1", "cat", (7, 10, 2014))]
 
+	def temporary_directory(self):
+		directory = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, directory)
+		return directory
+
 	def test_GenerateJsonCSS(self):
 		cg.generate_json_css(cg.expand_dates(self.events), self.json_path, self.css_path)
 		os.remove(self.json_path)
 		os.remove(self.css_path)
 
+	def test_JsonStreaming(self):
+		entries = cg.expand_dates(self.events)
+		out = io.StringIO()
+		groups = []
+		cg.write_json(entries, out, groups)
+		self.assertEqual(out.getvalue(), json.dumps({"success": 1, "result": [entry.getJson() for entry in entries]}))
+		self.assertEqual(groups, ["event-cat", "event-cat2", "event-cat1", "event-cat5e"])
+		out = io.StringIO()
+		cg.write_json([], out)
+		self.assertEqual(json.loads(out.getvalue()), {"success": 1, "result": []})
+
+	def test_JsonTimezone(self):
+		# the json times are the same with any timezone of the process
+		old_tz = os.environ.get("TZ")
+		results = []
+		try:
+			for zone in ["UTC", "Europe/Berlin", "America/New_York", "Asia/Kolkata"]:
+				os.environ["TZ"] = zone
+				time.tzset()
+				self.setUp()
+				out = io.StringIO()
+				cg.write_json(cg.expand_dates(self.events), out)
+				results.append(out.getvalue())
+				out = io.StringIO()
+				cg.write_json(cg.OccurrenceStore(self.events), out)
+				results.append(out.getvalue())
+		finally:
+			if old_tz is None:
+				del os.environ["TZ"]
+			else:
+				os.environ["TZ"] = old_tz
+			time.tzset()
+		self.assertEqual(set(results), set(results[:1]))
+		result = json.loads(results[0])["result"]
+		# 10.10.2014 00:00 CEST and 10.12.2014 12:00 CET
+		self.assertEqual((result[0]["start"], result[0]["end"]), (1412892000000, 1412978399999))
+		self.assertEqual((result[1]["start"], result[1]["end"]), (1418209200000, 1418219999999))
+
+	def test_JsonShards(self):
+		directory = self.temporary_directory()
+		jsonfile = os.path.join(directory, "events.json")
+		entries = cg.expand_dates(self.events)
+		cg.generate_json_shards(entries, jsonfile)
+		index = json.load(open(os.path.join(directory, "events-index.json")))
+		self.assertEqual(index["period"], "month")
+		self.assertEqual([shard["key"] for shard in index["shards"]], ["2014-10", "2014-12", "2015-01", "2015-02"])
+		shards = {}
+		for shard in index["shards"]:
+			result = json.load(open(os.path.join(directory, shard["file"])))["result"]
+			shards[shard["key"]] = set((event["id"], event["start"]) for event in result)
+			for event in result:
+				self.assertTrue(event["end"] >= shard["start"] and event["start"] < shard["end"])
+		everything = set((entry.getJson()["id"], entry.getJson()["start"]) for entry in entries)
+		self.assertEqual(set.union(*shards.values()), everything)
+		# "Event 4" lasts until january
+		self.assertEqual(len(shards["2015-01"] & shards["2014-12"]), 1)
+
+		# unchanged shards are not rewritten, obsolete shards are removed
+		os.utime(os.path.join(directory, "events-2014-10.json"), ns=(0, 0))
+		cg.generate_json_shards([entry for entry in entries if entry.start_date.month == 10], jsonfile)
+		self.assertEqual(os.stat(os.path.join(directory, "events-2014-10.json")).st_mtime_ns, 0)
+		self.assertEqual(sorted(os.listdir(directory)), ["events-2014-10.json", "events-index.json"])
+		cg.generate_json_shards(entries, jsonfile, "year")
+		self.assertEqual(sorted(os.listdir(directory)), ["events-2014.json", "events-2015.json", "events-index.json"])
+
+	def test_Compressed(self):
+		directory = self.temporary_directory()
+		ics = os.path.join(directory, "events.ics")
+		jsonfile = os.path.join(directory, "events.json")
+		css = os.path.join(directory, "category.css")
+		cg.generate_ical(self.events, ics, streaming=True, compress=("gzip", "unknown"))
+		cg.generate_json_css(cg.expand_dates(self.events), jsonfile, css, compress=("gzip",))
+		for filename in [ics, jsonfile, css]:
+			with open(filename, "rb") as f, gzip.open(filename + ".gz") as g:
+				self.assertEqual(f.read(), g.read())
+		self.assertFalse(os.path.exists(ics + ".unknown"))
+
+		# siblings are only rewritten if the content changed
+		os.utime(ics + ".gz", ns=(0, 0))
+		cg.generate_ical(self.events, ics, streaming=True, compress=("gzip",))
+		self.assertEqual(os.stat(ics + ".gz").st_mtime_ns, 0)
+		cg.generate_ical(self.events[:3], ics, streaming=True, compress=("gzip",))
+		self.assertNotEqual(os.stat(ics + ".gz").st_mtime_ns, 0)
+		with open(ics, "rb") as f, gzip.open(ics + ".gz") as g:
+			self.assertEqual(f.read(), g.read())
+
+		# the manifest notices missing siblings
+		manifest = cg.OutputManifest(directory)
+		cg.generate_ical(self.events, ics, manifest, compress=("gzip",))
+		os.remove(ics + ".gz")
+		cg.generate_ical(self.events, ics, manifest, compress=("gzip",))
+		self.assertTrue(os.path.exists(ics + ".gz"))
+
+	def test_AtomicWrite(self):
+		directory = self.temporary_directory()
+		ics = os.path.join(directory, "events.ics")
+		cg.generate_ical(self.events, ics, streaming=True)
+		expected = open(ics).read()
+
+		def broken(out):
+			out.write("BEGIN:VCALENDAR\r\n")
+			raise RuntimeError("broken")
+		self.assertRaises(RuntimeError, cg.write_stream_if_changed, ics, broken)
+		self.assertEqual(open(ics).read(), expected)
+		self.assertEqual(os.listdir(directory), ["events.ics"])
+
+	def test_Headers(self):
+		directory = self.temporary_directory()
+		ics = os.path.join(directory, "events.ics")
+		cg.generate_ical(self.events, ics, streaming=True, compress=("gzip",), headers=True)
+		for filename in [ics, ics + ".gz"]:
+			with open(filename, "rb") as f:
+				digest = hashlib.sha256(f.read()).hexdigest()
+			lines = open(filename + ".headers").read().splitlines()
+			self.assertEqual(lines[0], 'ETag: "%s"' % digest)
+			self.assertEqual(lines[1], "Last-Modified: %s" % email.utils.formatdate(os.stat(filename).st_mtime, usegmt=True))
+		os.utime(ics + ".headers", ns=(0, 0))
+		cg.generate_ical(self.events, ics, streaming=True, compress=("gzip",), headers=True)
+		self.assertEqual(os.stat(ics + ".headers").st_mtime_ns, 0)
+		cg.generate_ical(self.events[:3], ics, streaming=True, compress=("gzip",), headers=True)
+		self.assertNotEqual(os.stat(ics + ".headers").st_mtime_ns, 0)
+
 	def test_GenerateIcal(self):
 		cg.generate_ical(self.events, self.ics_path)
 		os.remove(self.ics_path)
 
+	def test_GenerateIcalStreaming(self):
+		cg.generate_ical(self.events, self.ics_path)
+		expected = open(self.ics_path).read()
+		os.remove(self.ics_path)
+		cg.generate_ical(self.events, self.ics_path, streaming=True)
+		content = open(self.ics_path).read()
+		os.remove(self.ics_path)
+
+		def components(content):
+			result = []
+			for component in ical.Calendar.from_ical(content).walk():
+				result.append((component.name, sorted((key, value.to_ical()) for key, value in component.items())))
+			return result
+		self.assertEqual(components(content), components(expected))
+		self.assertEqual(len(components(content)), 4 + len(self.events) - 1)
+
+	def test_IcalFold(self):
+		self.assertEqual(cg.ical_fold("a" * 74), "a" * 74)
+		self.assertEqual(cg.ical_fold("a" * 80), "a" * 74 + "\r\n " + "a" * 6)
+		folded = cg.ical_fold("SUMMARY:" + u"\u00fc" * 80)
+		self.assertTrue(all(len(line.encode("utf8")) <= 75 for line in folded.split("\r\n")))
+		self.assertEqual(folded.replace("\r\n ", ""), "SUMMARY:" + u"\u00fc" * 80)
+		self.assertEqual(cg.ical_text("a\\b;c,d\ne"), "a\\\\b\\;c\\,d\\ne")
+
 	def test_GenerateWiki(self):
 		now = cg.tz.localize(datetime.datetime(2014, 10, 10, 10, 10))
 		cg.generate_wiki_section(cg.expand_dates(self.events), "templates/termine_haupt.de.wiki", cg.LANG_DE, now=now)
+
+	def test_GenerateWikiSections(self):
+		now = cg.tz.localize(datetime.datetime(2014, 12, 10, 10, 10))
+		entries = cg.expand_dates(self.events)
+		sections = [("templates/termine_haupt.%s.wiki" % lang[:2], lang) for lang in [cg.LANG_DE, cg.LANG_EN, cg.LANG_FR]]
+		expected = [cg.generate_wiki_section(entries, templatefile, lang, now=now) for templatefile, lang in sections]
+		self.assertEqual(cg.generate_wiki_sections(entries, sections, now), expected)
+		with concurrent.futures.ThreadPoolExecutor(3) as executor:
+			self.assertEqual(cg.generate_wiki_sections(entries, sections, now, executor), expected)
+
+	def test_ExpandDatesWindow(self):
+		start = cg.tz.localize(datetime.datetime(2014, 12, 10, 13, 0))
+		end = cg.tz.localize(datetime.datetime(2015, 1, 6))
+		expected = [entry for entry in cg.expand_dates(self.events) if entry.end_datetime() > start and entry.start_datetime() < end]
+		self.assertEqual(cg.expand_dates(self.events, start, end), expected)
+
+	def test_OccurrenceStore(self):
+		entries = cg.expand_dates(self.events)
+		store = cg.OccurrenceStore(self.events)
+		self.assertEqual(len(store), len(entries))
+		self.assertEqual([entry.fingerprint() for entry in store], [entry.fingerprint() for entry in entries])
+		self.assertEqual(store.name_table.count("Event 6b"), 1)
+		self.assertEqual([store.ends[i] / 1000 for i in range(len(store))], [entry.end_datetime().timestamp() for entry in entries])
+		json_store, json_list = io.StringIO(), io.StringIO()
+		cg.write_json(store, json_store)
+		cg.write_json(entries, json_list)
+		self.assertEqual(json_store.getvalue(), json_list.getvalue())
+
+		start = cg.tz.localize(datetime.datetime(2014, 12, 10, 13, 0))
+		end = cg.tz.localize(datetime.datetime(2015, 1, 6))
+		self.assertEqual(list(cg.OccurrenceStore(self.events, start, end)), cg.expand_dates(self.events, start, end))
+
+		now = cg.tz.localize(datetime.datetime(2014, 12, 10, 10, 10))
+		index = cg.EventIndex(store)
+		self.assertEqual(cg.next_up(index, now), cg.next_up(entries, now))
+		self.assertEqual(cg.in_before(index, now), cg.in_before(entries, now))
+		self.assertEqual(index.next_change(now), cg.EventIndex(entries).next_change(now))
+
+	def test_OccurrenceStoreOrder(self):
+		# the order of the index is the one of sorted(entries), also for
+		# times before 1970, equal times and nested events
+		events = self.events + [cg.SingleDate("Old", "cat", (1, 1, 1960)),
+			cg.SingleDate("Older", "cat", (1, 1, 1950)),
+			cg.DateRange("Old range", "cat", (1, 1, 1949, 31, 12, 1960)),
+			cg.SingleDate("Event 0", "cat", (10, 10, 2014)),
+			cg.SingleDate("Event", "cat", (10, 10, 2014))]
+		entries = sorted(cg.expand_dates(events), key=cg.entry_sort_key)
+		index = cg.EventIndex(cg.OccurrenceStore(events))
+		self.assertEqual([entry.fingerprint() for entry in index], [entry.fingerprint() for entry in entries])
+		self.assertEqual(list(index.ends), list(cg.EventIndex(entries).ends))
+		self.assertEqual(index.max_duration, cg.EventIndex(entries).max_duration)
+		before = cg.tz.localize(datetime.datetime(1955, 1, 1))
+		self.assertEqual([entry.name for entry in index.starting_before(before)], ["Old range", "Older"])
+
+
+class TestOutputManifest(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.ics_path = os.path.join(self.directory, "events.ics")
+		self.json_path = os.path.join(self.directory, "events.json")
+		self.css_path = os.path.join(self.directory, "events.css")
+		self.events = [cg.SingleDate("Event", "cat", (10, 10, 2014)),
+			cg.WeekdayTimeGenerator("Event 6b", "cat5e", ("Mo", 13, 15), "12.12.2014 - 4.2.2015")]
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_skipUnchanged(self):
+		cg.generate_ical(self.events, self.ics_path, cg.OutputManifest(self.directory))
+		content = open(self.ics_path).read()
+		self.assertTrue(os.path.exists(os.path.join(self.directory, cg.MANIFEST_NAME)))
+
+		built = []
+		get_ical = cg.SingleDate.getIcal
+
+		def counting_get_ical(entry):
+			built.append(entry)
+			return get_ical(entry)
+		cg.SingleDate.getIcal = counting_get_ical
+		try:
+			cg.generate_ical(self.events, self.ics_path, cg.OutputManifest(self.directory))
+			self.assertEqual(built, [])
+			events = self.events + [cg.SingleDate("Event 2", "cat", (11, 10, 2014))]
+			cg.generate_ical(events, self.ics_path, cg.OutputManifest(self.directory))
+			self.assertEqual(len(built), 2)
+		finally:
+			cg.SingleDate.getIcal = get_ical
+		self.assertNotEqual(open(self.ics_path).read(), content)
+
+	def test_rewriteModified(self):
+		entries = cg.expand_dates(self.events)
+		cg.generate_json_css(entries, self.json_path, self.css_path, cg.OutputManifest(self.directory))
+		content = open(self.json_path).read()
+		with open(self.json_path, "w") as f:
+			f.write("broken")
+		cg.generate_json_css(entries, self.json_path, self.css_path, cg.OutputManifest(self.directory))
+		self.assertEqual(open(self.json_path).read(), content)
+		self.assertEqual(json.loads(content)["success"], 1)
+
+	def test_rewriteMissingShard(self):
+		entries = cg.expand_dates(self.events)
+		cg.generate_json_css(entries, self.json_path, self.css_path, cg.OutputManifest(self.directory), "month", ["gzip"])
+		shard = os.path.join(self.directory, "events-2015-01.json")
+		content = open(shard).read()
+		os.remove(shard)
+		os.remove(shard + ".gz")
+		cg.generate_json_css(entries, self.json_path, self.css_path, cg.OutputManifest(self.directory), "month", ["gzip"])
+		self.assertEqual(open(shard).read(), content)
+		self.assertEqual(gzip.open(shard + ".gz").read().decode("utf8"), content)
+
+	def test_storedDigests(self):
+		# unchanged siblings are not read again to write their headers
+		manifest = cg.OutputManifest(self.directory)
+		cg.write_output(self.json_path, "content", manifest, ["gzip"], True)
+		expected = open(self.json_path + ".gz.headers").read()
+		os.remove(self.json_path + ".gz.headers")
+		reads = []
+		read_bytes = cg.read_bytes
+		self.addCleanup(setattr, cg, "read_bytes", read_bytes)
+		cg.read_bytes = lambda filename: reads.append(filename) or read_bytes(filename)
+		cg.write_output(self.json_path, "content", manifest, ["gzip"], True)
+		self.assertEqual(reads, [])
+		self.assertEqual(open(self.json_path + ".gz.headers").read(), expected)
@@ -2,6 +2,10 @@
 
 import unittest
 import calendargenerator as cg
+import tempfile
+import shutil
+import os
+from .parser import count_analyze_date
 
 
 class TestSomeStuff(unittest.TestCase):
@@ -10,6 +14,12 @@ class TestSomeStuff(unittest.TestCase):
 		self.assertEqual(cg.day_of_week_str(1, cg.LANG_EN), "Tue")
 		self.assertEqual(cg.day_of_week_str(1, cg.LANG_FR), "Mar")
 
+	def test_DayOfWeekAll(self):
+		self.assertEqual([cg.day_of_week_str(i, cg.LANG_DE) for i in range(7)], ["Mo", "Di", "Mi", "Do", "Fr", "Sa", "So"])
+		self.assertEqual([cg.day_of_week_str(i, cg.LANG_EN) for i in range(7)], ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"])
+		self.assertEqual([cg.day_of_week_str(i, cg.LANG_FR) for i in range(7)], ["Lun", "Mar", "Mer", "Jeu", "Ven", "Sam", "Dim"])
+		self.assertEqual(cg.day_of_week_str(6, "de_AT.UTF-8"), "So")
+
 	def test_to(self):
 		self.assertEqual(cg.to_in_lang(cg.LANG_DE), "bis")
 		self.assertEqual(cg.to_in_lang(cg.LANG_EN), "to")
@@ -29,3 +39,64 @@ class TestUserInputError(unittest.TestCase):
 		for entry in result:
 			self.assertLessEqual(entry.start_datetime(), entry.end_datetime())
 		self.assertEqual(len(result), 1)
+
+
+class TestParseCache(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.content = open("tests/wiki/general.wiki").read()
+		self.calls = count_analyze_date(self)
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def test_hit(self):
+		expected = cg.render_page(cg.tokenize_wiki_page(self.content))
+		expected_lengths = [len(generator.entries) for generator in cg.parse_wiki_page(self.content) if isinstance(generator, cg.Generator)]
+		del self.calls[:]
+		cache = cg.ParseCache(self.directory)
+		self.assertEqual(cg.render_page(cache.tokenize(self.content)), expected)
+		self.assertEqual(len(self.calls), 13)
+		# a hit neither parses nor expands the weekly series again
+		self.addCleanup(setattr, cg.Series, "timestamps", cg.Series.timestamps)
+		cg.Series.timestamps = None
+		tokens = cg.ParseCache(self.directory).tokenize(self.content)
+		self.assertEqual(cg.render_page(tokens), expected)
+		self.assertEqual(len(self.calls), 13)
+		generators = [value for token, value in tokens if isinstance(value, cg.Generator)]
+		# occurrences are still only built when they are needed
+		self.assertTrue(all(generator._entries is None for generator in generators))
+		self.assertEqual([len(generator.entries) for generator in generators], expected_lengths)
+		self.assertEqual(len(cache.parse(self.content)), 13)
+
+	def test_version(self):
+		cache = cg.ParseCache(self.directory)
+		cache.tokenize(self.content)
+		parser_version = cg.parser_version
+		cg.parser_version = lambda: "other"
+		try:
+			cache.tokenize(self.content)
+		finally:
+			cg.parser_version = parser_version
+		self.assertEqual(len(self.calls), 26)
+		self.assertEqual(len(os.listdir(self.directory)), 2)
+
+	def test_evict(self):
+		cache = cg.ParseCache(self.directory, max_entries=2)
+		for i in range(4):
+			cache.tokenize(self.content + "\n%d" % i)
+		self.assertEqual(len(os.listdir(self.directory)), 2)
+		self.assertIsNotNone(cache.load(cache.key(self.content + "\n3")))
+		self.assertIsNone(cache.load(cache.key(self.content + "\n0")))
+
+	def test_evictRemoved(self):
+		# entries removed by another process meanwhile are skipped
+		cache = cg.ParseCache(self.directory, max_entries=1)
+		listdir = os.listdir
+		cg.os.listdir = lambda directory: listdir(directory) + ["gone.parsed"]
+		try:
+			cache.tokenize(self.content)
+			cache.tokenize(self.content + "\n1")
+		finally:
+			cg.os.listdir = listdir
+		self.assertEqual(len(os.listdir(self.directory)), 1)
@@ -2,6 +2,21 @@
 import unittest
 import calendargenerator as cg
 import datetime
+import io
+import contextlib
+
+
+def count_analyze_date(test):
+	# the arguments of all calls of cg.analyze_date until the end of test
+	calls = []
+	analyze_date = cg.analyze_date
+
+	def counting_analyze_date(*args):
+		calls.append(args)
+		return analyze_date(*args)
+	cg.analyze_date = counting_analyze_date
+	test.addCleanup(setattr, cg, "analyze_date", analyze_date)
+	return calls
 
 
 class TestUrls(unittest.TestCase):
@@ -75,6 +90,14 @@ class TestPlainName(unittest.TestCase):
 		url_date = cg.SingleDate("abc '''def''' '''ghi'''", "cat", [20, 9, 2014])
 		self.assertEqual(url_date.getPlainName(), "abc def ghi")
 
+	def test_sharedName(self):
+		generator = cg.WeekdayTimeGenerator("''[[Treff]]'' [https://example.org x]", "cat", ("Mo", 19, 0), "01.06.2015 - 29.06.2015")
+		names = set(id(entry.getPlainName()) for entry in generator.entries)
+		urls = set(entry.getURL() for entry in generator.entries)
+		self.assertEqual(len(names), 1)
+		self.assertEqual(generator.entries[0].getPlainName(), "Treff x")
+		self.assertEqual(urls, set(["https://stratum0.org/wiki/Treff"]))
+
 
 class TestWikiParser(unittest.TestCase):
 	def setUp(self):
@@ -108,3 +131,129 @@ class TestWikiParser(unittest.TestCase):
 		self.assertEqual(len(result), 1)
 		cg.generate_wiki_section(cg.expand_dates(result), "templates/termine_haupt.de.wiki", cg.LANG_DE, now=now)
 		cg.generate_ical(result, "/dev/null")
+
+	def test_parseWiki_noCategory(self):
+		content = "| X || 01.03.2015 ||\n|-\n| Y || So, 19:00 || 01.03.2015 - 30.04.2015\n== cat ==\n| Z || 02.03.2015 ||"
+		result = cg.parse_wiki_page(content)
+		self.assertEqual([(entry.name, entry.category) for entry in result], [("X", None), ("Y", None), ("Z", "cat")])
+		self.assertEqual(len(cg.expand_dates(result)), 11)
+
+	def test_parseWiki_dstGap(self):
+		# 02:00 does not exist on 29.03.2015, the row is dropped
+		content = "== cat ==\n| X || So, 02:00 - 03:00 || 01.03.2015 - 30.04.2015\n|-\n| Y || So, 19:00 || 01.03.2015 - 30.04.2015"
+		stderr = io.StringIO()
+		with contextlib.redirect_stderr(stderr):
+			tokens = cg.tokenize_wiki_page(content)
+		self.assertIn("InvalidDate: X", stderr.getvalue())
+		self.assertIn((cg.T_INVALID_EVENT, "| X || So, 02:00 - 03:00 || 01.03.2015 - 30.04.2015"), tokens)
+		result = [value for token, value in tokens if token == cg.T_EVENT]
+		self.assertEqual([entry.name for entry in result], ["Y"])
+		self.assertEqual(len(cg.expand_dates(result)), 9)
+
+
+class TestDateMatcher(unittest.TestCase):
+	cells = ["20.9.2014", "20.09.2014 19:00", "20.09.2014 19.00", "20.09.2014 19:00-22:00",
+		"19.06.2014 -22.06.2014", "28.06.2014 21:00 -29.06.2014 07:00", "Mi, 19.00",
+		"Di/2 19.00", "Do 19:00 - 23:30", "bla 19.00", "20.09.2014 - 19:00", "", "19.00"]
+
+	def cascade(self, date):
+		for regex, dateClass in cg.tests:
+			rg = regex.match(date)
+			if rg:
+				return dateClass, rg.groups()
+		return None
+
+	def test_sameAsCascade(self):
+		for cell in self.cells:
+			expected = self.cascade(cell)
+			dateClass, values = cg.match_date(cell)
+			if expected is None:
+				self.assertIsNone(dateClass, cell)
+				continue
+			self.assertEqual((dateClass, values), expected, cell)
+
+
+class TestTokenizer(unittest.TestCase):
+	def test_lines(self):
+		content = "a\r\nb\n\n c \rd\x85\ne\n"
+		self.assertEqual(list(cg.iter_lines(content)), content.splitlines())
+		for chunk_size in (1, 2, 3):
+			self.assertEqual(list(cg.iter_string_lines(content, chunk_size)), content.splitlines())
+		self.assertEqual(list(cg.iter_lines(["a\n", "", "b"])), ["a", "", "b"])
+
+	def test_file(self):
+		content = open("tests/wiki/general.wiki").read()
+		with open("tests/wiki/general.wiki") as f:
+			from_file = [(token, value) for token, value in cg.iter_wiki_page(f) if token != cg.T_EVENT]
+		from_string = [(token, value) for token, value in cg.tokenize_wiki_page(content) if token != cg.T_EVENT]
+		self.assertEqual(from_file, from_string)
+
+	def test_lazy(self):
+		lines = iter(["== cat ==", "| a || 1.1.2015 ||", "| b || 2.1.2015 ||"])
+		tokens = cg.iter_wiki_page(lines)
+		self.assertEqual(next(tokens), (cg.T_CATEGORY, "cat"))
+		self.assertEqual(next(tokens)[1].name, "a")
+		self.assertEqual(next(lines), "| b || 2.1.2015 ||")
+
+	def test_parallel(self):
+		def comparable(tokens):
+			return [(token, value.fingerprint() if token == cg.T_EVENT else value) for token, value in tokens]
+		content = open("tests/wiki/general.wiki").read()
+		chunk_lines = cg.PARALLEL_CHUNK_LINES
+		cg.PARALLEL_CHUNK_LINES = 5
+		try:
+			chunks = cg.split_wiki_page(content.splitlines(), 8)
+			parallel = cg.tokenize_wiki_page(content, workers=2)
+			events, archive, n = cg.move_to_archive(content, "", cg.tz.localize(datetime.datetime(2014, 7, 15)), workers=2)
+		finally:
+			cg.PARALLEL_CHUNK_LINES = chunk_lines
+		self.assertGreater(len(chunks), 2)
+		self.assertEqual(sum(chunks, []), content.splitlines())
+		self.assertTrue(all(cg.category_re.match(chunk[0].strip()) for chunk in chunks[1:]))
+		sequential = cg.tokenize_wiki_page(content)
+		self.assertEqual(comparable(parallel), comparable(sequential))
+		self.assertEqual(cg.render_page(parallel), cg.render_page(sequential))
+		self.assertEqual((events, archive, n), cg.move_to_archive(content, "", cg.tz.localize(datetime.datetime(2014, 7, 15))))
+		# small pages are not split
+		self.assertEqual(comparable(cg.tokenize_wiki_page(content, workers=4)), comparable(sequential))
+
+
+class TestRenderPage(unittest.TestCase):
+	def test_roundtrip(self):
+		content = open("tests/wiki/general.wiki").read()
+		tokens = cg.tokenize_wiki_page(content)
+		self.assertEqual(cg.render_page(tokens), "".join(cg.render_lines(tokens)).strip())
+		self.assertTrue(cg.render_page(tokens).startswith("ignore this text\n\n== CTF-Stuff =="))
+
+	def test_strip(self):
+		tokens = [(cg.T_REST, "  "), (cg.T_REST, " text "), (cg.T_ROW_DIVIDER, None), (cg.T_REST, ""), (cg.T_REST, "\t")]
+		self.assertEqual(cg.render_page(tokens), "text \n|-")
+		self.assertEqual(cg.render_page([(cg.T_REST, " ")]), "")
+
+	def test_writePage(self):
+		tokens = cg.tokenize_wiki_page(open("tests/wiki/general.wiki").read())
+		out = io.StringIO()
+		cg.write_page(tokens, out)
+		self.assertEqual(out.getvalue(), cg.render_page(tokens))
+
+
+class TestArchive(unittest.TestCase):
+	def setUp(self):
+		self.content = open("tests/wiki/general.wiki").read()
+		self.threshold = cg.tz.localize(datetime.datetime(2014, 7, 15))
+
+	def test_moveToArchive(self):
+		events, archive, n = cg.move_to_archive(self.content, "", self.threshold)
+		self.assertEqual(n, 5)
+		self.assertEqual(len(cg.parse_wiki_page(events)), 8)
+		self.assertEqual(len(cg.parse_wiki_page(archive)), 5)
+		self.assertTrue(archive.startswith("= Termine Archiv =\n== CTF-Stuff =="))
+
+		events2, archive2, n2 = cg.move_to_archive(events, archive, self.threshold)
+		self.assertEqual((events2, archive2, n2), (events, archive, 0))
+
+	def test_singleParse(self):
+		_, archive, _ = cg.move_to_archive(self.content, "", self.threshold)
+		calls = count_analyze_date(self)
+		cg.move_to_archive(self.content, archive, self.threshold)
+		self.assertEqual(len(calls), 13 + 5)
@@ -1,3 +1,3 @@
 #!/bin/bash
-nosetests -vs --with-coverage --cover-package=calendargenerator
+nosetests -vs --with-coverage --cover-package=calendargenerator,wikiclient
 pep8 --ignore=E501,W191,E128 *.py tests/*.py
\ No newline at end of file
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -.- encoding: utf-8 -.-
+# asyncio access to the small part of the MediaWiki API the bots use, over a
+# pool of keep-alive connections, plus a blocking facade that looks like the
+# parts of mwclient.Site the bots used before
+import asyncio
+import concurrent.futures
+import http.client
+import http.cookies
+import json
+import threading
+import time
+import urllib.parse
+
+POOL_SIZE = 4
+TIMEOUT = 30
+# titles per action=query request allowed for normal users
+MAX_TITLES = 50
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+class APIError(Exception):
+	def __init__(self, code, info):
+		Exception.__init__(self, "%s: %s" % (code, info))
+		self.code = code
+		self.info = info
+
+
+class LoginError(Exception):
+	pass
+
+
+class ConnectionPool(object):
+	# blocking keep-alive connections to a single host, at most `size` of
+	# them are in use at the same time
+	def __init__(self, scheme, host, size=POOL_SIZE, timeout=TIMEOUT):
+		if scheme == "https":
+			self.connection_class = http.client.HTTPSConnection
+		else:
+			self.connection_class = http.client.HTTPConnection
+		self.host = host
+		self.timeout = timeout
+		self.idle = []
+		self.lock = threading.Lock()
+		self.slots = threading.BoundedSemaphore(size)
+
+	def request(self, method, path, body=None, headers={}):
+		with self.slots:
+			# an idle connection may have been closed by the server, so a
+			# failing request is repeated once on a new connection
+			for retry in (False, True):
+				with self.lock:
+					connection = self.idle.pop() if self.idle and not retry else None
+				if connection is None:
+					connection = self.connection_class(self.host, timeout=self.timeout)
+				try:
+					connection.request(method, path, body, headers)
+					response = connection.getresponse()
+					data = response.read()
+				except (http.client.HTTPException, OSError):
+					connection.close()
+					if retry:
+						raise
+					continue
+				if response.will_close:
+					connection.close()
+				else:
+					with self.lock:
+						self.idle.append(connection)
+				return response.status, response.getheaders(), data
+
+	def close(self):
+		with self.lock:
+			for connection in self.idle:
+				connection.close()
+			self.idle = []
+
+
+def parse_timestamp(timestamp):
+	# mwclient returned revision timestamps as time.struct_time (UTC)
+	return time.strptime(timestamp, TIMESTAMP_FORMAT)
+
+
+def revision_info(page):
+	# text and last revision of a page in a formatversion=2 query result
+	# basetimestamp and starttimestamp are sent back with an edit of the page
+	# so the wiki rejects it if someone else edited the page meanwhile
+	info = {"title": page["title"], "text": "", "revid": None, "timestamp": None, "user": None, "comment": None, "basetimestamp": None, "starttimestamp": None}
+	if page.get("missing") or not page.get("revisions"):
+		return info
+	revision = page["revisions"][0]
+	if "slots" in revision:
+		info["text"] = revision["slots"]["main"].get("content", "")
+	else:
+		info["text"] = revision.get("content", "")
+	info["revid"] = revision.get("revid")
+	info["timestamp"] = parse_timestamp(revision["timestamp"]) if "timestamp" in revision else None
+	info["basetimestamp"] = revision.get("timestamp")
+	info["user"] = revision.get("user")
+	info["comment"] = revision.get("comment")
+	return info
+
+
+class AsyncSite(object):
+	def __init__(self, host, path="/mediawiki/", scheme="https", pool_size=POOL_SIZE, timeout=TIMEOUT):
+		self.host = host
+		self.endpoint = path + "api.php"
+		self.pool = ConnectionPool(scheme, host, pool_size, timeout)
+		self.executor = concurrent.futures.ThreadPoolExecutor(pool_size)
+		self.cookies = http.cookies.SimpleCookie()
+		self.logged_in = False
+		self.csrf_token = None
+
+	async def api(self, action, method="GET", **params):
+		params["action"] = action
+		params["format"] = "json"
+		params["formatversion"] = 2
+		query = urllib.parse.urlencode(params)
+		headers = {"User-Agent": "stratum0-calendar"}
+		cookies = "; ".join("%s=%s" % (key, morsel.value) for key, morsel in self.cookies.items())
+		if cookies:
+			headers["Cookie"] = cookies
+		if method == "POST":
+			path, body = self.endpoint, query.encode("utf8")
+			headers["Content-Type"] = "application/x-www-form-urlencoded"
+		else:
+			path, body = "%s?%s" % (self.endpoint, query), None
+		loop = asyncio.get_event_loop()
+		status, response_headers, data = await loop.run_in_executor(self.executor, self.pool.request, method, path, body, headers)
+		for key, value in response_headers:
+			if key.lower() == "set-cookie":
+				self.cookies.load(value)
+		if status != 200:
+			raise APIError("http", "HTTP status %d" % status)
+		result = json.loads(data.decode("utf8"))
+		if "error" in result:
+			raise APIError(result["error"].get("code"), result["error"].get("info"))
+		return result
+
+	async def pages(self, titles):
+		# text and last revision (revid, timestamp, user, comment) of all
+		# titles, with one request per MAX_TITLES titles
+		titles = list(titles)
+		chunks = [titles[i:i + MAX_TITLES] for i in range(0, len(titles), MAX_TITLES)]
+		results = await asyncio.gather(*[self.api("query", prop="revisions", rvprop="ids|timestamp|user|comment|content", rvslots="main", curtimestamp=1, titles="|".join(chunk)) for chunk in chunks])
+		pages = {}
+		for result in results:
+			query = result.get("query", {})
+			for page in query.get("pages", []):
+				pages[page["title"]] = revision_info(page)
+				pages[page["title"]]["starttimestamp"] = result.get("curtimestamp")
+			for normalized in query.get("normalized", []):
+				pages[normalized["from"]] = pages[normalized["to"]]
+		return pages
+
+	async def revision_ids(self, titles):
+		# only the id of the last revision of each title, without content
+		result = await self.api("query", prop="revisions", rvprop="ids", titles="|".join(titles))
+		query = result.get("query", {})
+		ids = dict((page["title"], revision_info(page)["revid"]) for page in query.get("pages", []))
+		for normalized in query.get("normalized", []):
+			ids[normalized["from"]] = ids[normalized["to"]]
+		return ids
+
+	async def login(self, user, password):
+		result = await self.api("query", meta="tokens", type="login")
+		token = result["query"]["tokens"]["logintoken"]
+		result = await self.api("login", "POST", lgname=user, lgpassword=password, lgtoken=token)
+		if result["login"]["result"] != "Success":
+			raise LoginError(result["login"].get("reason", result["login"]["result"]))
+		self.logged_in = True
+		self.csrf_token = None
+
+	async def token(self):
+		if self.csrf_token is None:
+			result = await self.api("query", meta="tokens", type="csrf")
+			self.csrf_token = result["query"]["tokens"]["csrftoken"]
+		return self.csrf_token
+
+	async def save(self, title, text, summary="", minor=False, basetimestamp=None, starttimestamp=None):
+		# like mwclient, a bot edit that fails instead of overwriting changes
+		# made since the text was fetched (APIError "editconflict")
+		params = {"title": title, "text": text, "summary": summary, "bot": 1, "assert": "user", "token": await self.token()}
+		if minor:
+			params["minor"] = 1
+		if basetimestamp:
+			params["basetimestamp"] = basetimestamp
+		if starttimestamp:
+			params["starttimestamp"] = starttimestamp
+		result = await self.api("edit", "POST", **params)
+		if result["edit"]["result"] != "Success":
+			raise APIError("edit", result["edit"]["result"])
+		return result["edit"]
+
+	async def save_many(self, edits):
+		# edits is a list of (title, text, summary, minor[, basetimestamp,
+		# starttimestamp]), they share one token and are sent concurrently
+		await self.token()
+		return await asyncio.gather(*[self.save(*edit) for edit in edits])
+
+	async def purge(self, titles):
+		result = await self.api("purge", "POST", titles="|".join(titles))
+		return result["purge"]
+
+	def close(self):
+		self.executor.shutdown()
+		self.pool.close()
+
+
+class Revisions(object):
+	# iterator with the py2 style next() of mwclient's listings
+	def __init__(self, revisions):
+		self.revisions = iter(revisions)
+
+	def __iter__(self):
+		return self
+
+	def __next__(self):
+		return next(self.revisions)
+
+	next = __next__
+
+
+class Page(object):
+	def __init__(self, site, name):
+		self.site = site
+		self.name = name
+		self.info = None
+
+	def load(self):
+		if self.info is None:
+			self.info = self.site.run(self.site.api.pages([self.name]))[self.name]
+		return self.info
+
+	def text(self):
+		return self.load()["text"]
+
+	def timestamps(self):
+		# (basetimestamp, starttimestamp) of the loaded text, nothing if the
+		# page was not loaded
+		if self.info is None:
+			return (None, None)
+		return (self.info["basetimestamp"], self.info["starttimestamp"])
+
+	def revisions(self, limit=1, prop=None):
+		# only the latest revision is known
+		info = self.load()
+		if info["revid"] is None or limit < 1:
+			return Revisions([])
+		return Revisions([{"revid": info["revid"], "timestamp": info["timestamp"], "user": info["user"], "comment": info["comment"]}])
+
+	def save(self, text, summary="", minor=False):
+		result = self.site.run(self.site.api.save(self.name, text, summary, minor, *self.timestamps()))
+		self.info = None
+		return result
+
+	def purge(self):
+		return self.site.run(self.site.api.purge([self.name]))
+
+
+class PageList(object):
+	def __init__(self, site):
+		self.site = site
+		self.pages = {}
+		self.lock = threading.Lock()
+
+	def __getitem__(self, name):
+		with self.lock:
+			if name not in self.pages:
+				self.pages[name] = Page(self.site, name)
+			return self.pages[name]
+
+
+class Site(object):
+	# blocking facade for AsyncSite, the coroutines run on an event loop in a
+	# background thread so it can be used from several threads at once
+	def __init__(self, host, path="/mediawiki/", pool_size=POOL_SIZE, timeout=TIMEOUT):
+		if isinstance(host, tuple):
+			scheme, host = host
+		else:
+			scheme = "https"
+		self.api = AsyncSite(host, path, scheme, pool_size, timeout)
+		self.loop = asyncio.new_event_loop()
+		self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+		self.thread.start()
+		self.Pages = PageList(self)
+
+	def run(self, coroutine):
+		return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+	@property
+	def logged_in(self):
+		return self.api.logged_in
+
+	def login(self, user, password):
+		self.run(self.api.login(user, password))
+
+	def fetch(self, names):
+		# text and last revision (revid, timestamp, user, comment) of the
+		# given pages with a single request, text() and revisions() of the
+		# pages use the result
+		infos = self.run(self.api.pages(names))
+		for name in names:
+			self.Pages[name].info = infos[name]
+		return dict((name, infos[name]) for name in names)
+
+	def revision_ids(self, names):
+		return self.run(self.api.revision_ids(names))
+
+	def save_many(self, edits):
+		# the timestamps of the pages as they were fetched
+		edits = [tuple(edit) + self.Pages[edit[0]].timestamps() for edit in edits]
+		result = self.run(self.api.save_many(edits))
+		for edit in edits:
+			self.Pages[edit[0]].info = None
+		return result
+
+	def purge(self, names):
+		return self.run(self.api.purge(names))
+
+	def close(self):
+		self.loop.call_soon_threadsafe(self.loop.stop)
+		self.thread.join()
+		self.loop.close()
+		self.api.close()